@@ -0,0 +1,291 @@
+"""
+Latency, throughput and query-count benchmark for every route in
+``orgapp/urls.py``.
+
+    python -m benchmarks.api --organizations 10 --roles-per-organization 100 \\
+        --users 100000 --concurrency 1,8,32 --requests 200 --output api.json
+
+Requests go through Django's test client authenticated with a session (or a
+JWT access token with ``--auth jwt``), one client per worker thread. For each concurrency level and route the report
+holds p50/p95/p99 latency, throughput and the mean number of SQL queries
+per request, together with the git revision so runs can be compared across
+commits.
+
+The shared-cache in-memory database fails concurrent access with "database
+table is locked"; use ``--database-file`` for concurrency above one.
+"""
+import argparse
+import itertools
+import logging
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import PROJECT_DIR, create_database, destroy_database, percentiles, setup_django, write_report
+
+
+class Route:
+    def __init__(self, name, method, path, data=None, fmt='json', share=1.0):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.fmt = fmt
+        # Fraction of --requests sent to this route; heavy routes use less.
+        self.share = share
+
+    def __call__(self, client, sequence):
+        path = self.path(sequence) if callable(self.path) else self.path
+        data = self.data(sequence) if callable(self.data) else self.data
+        send = getattr(client, self.method)
+        if self.method == 'get':
+            response = send(path)
+        else:
+            response = send(path, data, format=self.fmt)
+        if getattr(response, 'streaming', False):
+            for _ in response.streaming_content:
+                pass
+        return response.status_code
+
+
+def build_routes(fixtures):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.urls import reverse
+
+    from orgapp.authentication import ClaimsRefreshToken
+
+    organization_id = fixtures['organization_id']
+    role_id = fixtures['role_id']
+    user_ids = fixtures['user_ids']
+    disposable_ids = iter(fixtures['disposable_ids'])
+
+    def pick_user(sequence):
+        return user_ids[sequence % len(user_ids)]
+
+    def import_file(sequence):
+        content = 'username,email,organization\nbench-import-%d,bench-import-%d@example.com,%s\n' % (
+            sequence, sequence, fixtures['organization_name'],
+        )
+        return {'file': SimpleUploadedFile('users.csv', content.encode())}
+
+    def bulk_users(sequence):
+        return [
+            {'username': 'bench-bulk-%d-%d' % (sequence, index), 'email': 'bench-bulk-%d-%d@example.com' % (sequence, index),
+             'password': 'password', 'organization': organization_id, 'roles': [role_id]}
+            for index in range(10)
+        ]
+
+    credentials = {'username': fixtures['superuser'].username, 'password': 'password'}
+    refresh = str(ClaimsRefreshToken.for_user(fixtures['superuser']))
+
+    return [
+        Route('organization-list', 'get', reverse('organization-list')),
+        Route('organization-detail', 'get', reverse('organization-detail', args=[organization_id])),
+        Route('organization-summary', 'get', reverse('organization-summary', args=[organization_id])),
+        Route('organization-descendants', 'get', reverse('organization-descendants', args=[organization_id])),
+        Route('organization-ancestors', 'get', reverse('organization-ancestors', args=[organization_id])),
+        Route('role-list', 'get', reverse('role-list')),
+        Route('role-detail', 'get', reverse('role-detail', args=[role_id])),
+        Route('user-list', 'get', reverse('user-list')),
+        Route('user-detail', 'get', lambda sequence: reverse('user-detail', args=[pick_user(sequence)])),
+        Route('async-organization-list', 'get', reverse('async-organization-list')),
+        Route('async-organization-detail', 'get', reverse('async-organization-detail', args=[organization_id])),
+        Route('async-role-list', 'get', reverse('async-role-list')),
+        Route('async-role-detail', 'get', reverse('async-role-detail', args=[role_id])),
+        Route('async-user-list', 'get', reverse('async-user-list')),
+        Route('async-user-detail', 'get', lambda sequence: reverse('async-user-detail', args=[pick_user(sequence)])),
+        Route('audit-log', 'get', reverse('auditlog-list')),
+        Route('export-roles', 'get', reverse('export', args=['roles']), share=0.1),
+        Route('export-users', 'get', reverse('export', args=['users']), share=0.02),
+        Route(
+            'user-assign-role', 'post',
+            lambda sequence: reverse('user-assign-role', args=[pick_user(sequence)]),
+            {'roles': [role_id]},
+        ),
+        Route(
+            'user-bulk-assign-roles', 'post', reverse('user-bulk-assign-roles'),
+            lambda sequence: {'user_ids': user_ids[:100], 'role_ids': [role_id], 'mode': 'add'},
+        ),
+        Route('user-import', 'post', reverse('user-import'), import_file, fmt='multipart'),
+        # Both hash passwords, which dominates their latency.
+        Route('user-bulk-create', 'post', reverse('user-bulk-create'), bulk_users, share=0.1),
+        Route('token-obtain', 'post', reverse('token-obtain'), credentials, share=0.1),
+        Route('token-refresh', 'post', reverse('token-refresh'), {'refresh': refresh}),
+        Route(
+            'delete-user', 'delete',
+            lambda sequence: reverse('delete_user', args=[next(disposable_ids)]),
+        ),
+    ]
+
+
+def prepare_fixtures(args):
+    from orgapp.models import Organization, Role, User
+
+    from benchmarks.seed import seed
+
+    dataset = seed(
+        organizations=args.organizations,
+        roles_per_organization=args.roles_per_organization,
+        users=args.users,
+        roles_per_user=args.roles_per_user,
+    )
+    organization = Organization.objects.order_by('id').first()
+    superuser = User.objects.create_superuser(
+        username='bench-superuser', email='bench-superuser@example.com', password='password',
+        organization=organization,
+    )
+    # delete-user removes one of these per request.
+    disposable_count = args.requests * len(args.concurrency)
+    User.objects.bulk_create([
+        User(username='bench-disposable-%d' % index, email='bench-disposable-%d@example.com' % index,
+             organization=organization)
+        for index in range(disposable_count)
+    ], batch_size=1000)
+    return dataset, {
+        'superuser': superuser,
+        'organization_id': organization.id,
+        'organization_name': organization.name,
+        'role_id': Role.objects.filter(organization=organization).order_by('id').values_list('id', flat=True).first(),
+        'user_ids': list(User.objects.filter(organization=organization, is_superuser=False)
+                         .exclude(username__startswith='bench-').order_by('id').values_list('id', flat=True)[:1000]),
+        'disposable_ids': list(User.objects.filter(username__startswith='bench-disposable-')
+                               .order_by('id').values_list('id', flat=True)),
+    }
+
+
+def access_token(user):
+    from datetime import timedelta
+
+    from orgapp.authentication import ClaimsRefreshToken
+
+    token = ClaimsRefreshToken.for_user(user).access_token
+    # Outlive the run rather than the configured access token lifetime.
+    token.set_exp(lifetime=timedelta(days=1))
+    return str(token)
+
+
+def run_route(route, superuser, concurrency, total, sequence, token=None):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+
+    local = threading.local()
+    lock = threading.Lock()
+    samples = []
+    queries = []
+    errors = []
+
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = APIClient()
+            if token:
+                local.client.credentials(HTTP_AUTHORIZATION='Bearer ' + token)
+            else:
+                local.client.force_login(superuser)
+        return local.client
+
+    def one(_):
+        current = next(sequence)
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            try:
+                status_code = route(client(), current)
+            except Exception as exc:
+                status_code = repr(exc)
+            elapsed = time.perf_counter() - started
+        with lock:
+            samples.append(elapsed)
+            queries.append(len(captured.captured_queries))
+            if not isinstance(status_code, int) or status_code >= 400:
+                errors.append(status_code)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    result = {
+        'requests': total,
+        'errors': len(errors),
+        'throughput_rps': round(total / wall, 2) if wall else None,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else 0,
+    }
+    if errors:
+        result['error_samples'] = sorted({str(error) for error in errors})[:5]
+    result.update(percentiles(samples))
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR, stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--organizations', type=int, default=10)
+    parser.add_argument('--roles-per-organization', type=int, default=100)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--roles-per-user', type=int, default=1)
+    parser.add_argument('--concurrency', type=lambda value: [int(level) for level in value.split(',')], default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=200, help='Requests per route and concurrency level.')
+    parser.add_argument('--auth', choices=('session', 'jwt'), default='session')
+    parser.add_argument('--routes', help='Comma-separated route names to run (default: all).')
+    parser.add_argument('--database-file', help='Keep the benchmark database in this file instead of memory.')
+    parser.add_argument('--output', help='Write the JSON report to this file.')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+
+    from orgapp import audit
+
+    # Failed requests are counted in the report instead of logged.
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    old_name = settings.DATABASES['default']['NAME']
+    settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['testserver']
+    create_database(args.database_file)
+    try:
+        dataset, fixtures = prepare_fixtures(args)
+        routes = build_routes(fixtures)
+        token = access_token(fixtures['superuser']) if args.auth == 'jwt' else None
+        if args.routes:
+            wanted = set(args.routes.split(','))
+            routes = [route for route in routes if route.name in wanted]
+        sequence = itertools.count()
+        results = {}
+        for concurrency in args.concurrency:
+            level = results[str(concurrency)] = {}
+            for route in routes:
+                total = max(1, int(args.requests * route.share))
+                level[route.name] = run_route(
+                    route, fixtures['superuser'], concurrency, total, sequence, token,
+                )
+                print('concurrency=%d %-24s p50=%sms rps=%s queries=%s errors=%d' % (
+                    concurrency, route.name, level[route.name].get('p50_ms'), level[route.name]['throughput_rps'],
+                    level[route.name]['queries_per_request'], level[route.name]['errors'],
+                ))
+        audit.flush()
+    finally:
+        # Queued audit entries must reach the benchmark database, not the
+        # atexit hook after it is gone.
+        audit.shutdown()
+        destroy_database(old_name)
+
+    write_report({
+        'revision': git_revision(),
+        'database': 'file' if args.database_file else 'memory',
+        'auth': args.auth,
+        'dataset': dataset,
+        'concurrency': args.concurrency,
+        'results': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""
+Throughput of the sync read routes under WSGI against the /api/async/
+routes under ASGI, at a fixed number of concurrent connections.
+
+    python -m benchmarks.asgi_vs_wsgi --users 100000 --connections 500 \\
+        --requests 5000 --wsgi-threads 32 --output asgi_vs_wsgi.json
+
+Both sides run in process, without a network server. The WSGI side models
+a threaded server: ``--connections`` client threads send requests through
+Django's test Client, and a semaphore lets only ``--wsgi-threads`` of them
+be handled at once. The ASGI side runs ``--connections`` coroutines against
+Django's AsyncClient on one event loop, with reads served by the
+``ORGAPP_ASYNC_WORKERS`` pool. Latency includes time spent queued. The
+database is a file, since in-memory SQLite cannot be shared between threads
+under load.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import create_database, destroy_database, percentiles, setup_django, write_report
+
+ROUTES = (
+    ('organization-list', None),
+    ('role-list', None),
+    ('user-list', None),
+    ('user-detail', 'user_id'),
+)
+
+
+def session_cookie(user):
+    from django.conf import settings
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.sessions.backends.db import SessionStore
+
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return settings.SESSION_COOKIE_NAME, session.session_key
+
+
+def summarize(samples, errors, wall):
+    result = {
+        'requests': len(samples),
+        'errors': errors,
+        'throughput_rps': round(len(samples) / wall, 2) if wall else None,
+    }
+    result.update(percentiles(samples))
+    return result
+
+
+def run_wsgi(path, cookie, connections, requests, threads):
+    from django.test import Client
+
+    server_threads = threading.Semaphore(threads)
+    lock = threading.Lock()
+    samples = []
+    errors = []
+    per_connection = max(1, requests // connections)
+
+    def connection(_):
+        client = Client()
+        client.cookies[cookie[0]] = cookie[1]
+        for _ in range(per_connection):
+            started = time.perf_counter()
+            with server_threads:
+                status_code = client.get(path).status_code
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples.append(elapsed)
+                if status_code != 200:
+                    errors.append(status_code)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        list(pool.map(connection, range(connections)))
+    return summarize(samples, len(errors), time.perf_counter() - started)
+
+
+def run_asgi(path, cookie, connections, requests):
+    from django.test import AsyncClient
+
+    samples = []
+    errors = []
+    per_connection = max(1, requests // connections)
+
+    async def connection():
+        client = AsyncClient()
+        client.cookies[cookie[0]] = cookie[1]
+        for _ in range(per_connection):
+            started = time.perf_counter()
+            response = await client.get(path)
+            samples.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    async def main():
+        await asyncio.gather(*(connection() for _ in range(connections)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return summarize(samples, len(errors), time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--organizations', type=int, default=10)
+    parser.add_argument('--roles-per-organization', type=int, default=100)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--connections', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=5000, help='Requests per route and server type.')
+    parser.add_argument('--wsgi-threads', type=int, default=32)
+    parser.add_argument('--async-workers', type=int, help='Overrides ORGAPP_ASYNC_WORKERS.')
+    parser.add_argument('--database-file', help='Defaults to a temporary file.')
+    parser.add_argument('--output', help='Write the JSON report to this file.')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.urls import reverse
+
+    from benchmarks.seed import seed
+    from orgapp.models import Organization, User
+
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['testserver']
+    if args.async_workers:
+        settings.ORGAPP_ASYNC_WORKERS = args.async_workers
+    database_file = args.database_file or os.path.join(tempfile.mkdtemp(), 'asgi_vs_wsgi.sqlite3')
+
+    old_name = settings.DATABASES['default']['NAME']
+    create_database(database_file)
+    try:
+        dataset = seed(
+            organizations=args.organizations,
+            roles_per_organization=args.roles_per_organization,
+            users=args.users,
+        )
+        superuser = User.objects.create_superuser(
+            username='bench-superuser', email='bench-superuser@example.com', password='password',
+            organization=Organization.objects.order_by('id').first(),
+        )
+        cookie = session_cookie(superuser)
+        user_id = User.objects.order_by('id').values_list('id', flat=True).first()
+
+        results = {}
+        for name, argument in ROUTES:
+            route_args = [user_id] if argument else []
+            sync_path = reverse(name, args=route_args)
+            async_path = reverse('async-' + name, args=route_args)
+            results[name] = {
+                'wsgi': run_wsgi(sync_path, cookie, args.connections, args.requests, args.wsgi_threads),
+                'asgi': run_asgi(async_path, cookie, args.connections, args.requests),
+            }
+            print('%-18s wsgi %8s rps p99=%sms | asgi %8s rps p99=%sms' % (
+                name,
+                results[name]['wsgi']['throughput_rps'], results[name]['wsgi'].get('p99_ms'),
+                results[name]['asgi']['throughput_rps'], results[name]['asgi'].get('p99_ms'),
+            ))
+    finally:
+        destroy_database(old_name)
+
+    write_report({
+        'dataset': dataset,
+        'connections': args.connections,
+        'wsgi_threads': args.wsgi_threads,
+        'async_workers': getattr(settings, 'ORGAPP_ASYNC_WORKERS', None),
+        'results': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Write latency with the audit log off, written in the request, and written by
+the background worker.
+
+    python -m benchmarks.audit --users 1000 --requests 500 --output audit.json
+
+Each mode sends ``--requests`` PATCH requests to ``/api/users/<id>/`` (one
+client, session authentication), changing ``first_name`` so every request
+produces an audit entry. ``off`` replaces ``orgapp.audit.record`` with a
+no-op, ``sync`` sets ``ORGAPP_AUDIT_ASYNC = False`` and ``async`` is the
+default configuration; its time to drain the queue afterwards is reported
+separately as ``flush_ms``. The worker needs its own connection to the
+database, so a temporary file is used unless ``--database-file`` is given.
+"""
+import argparse
+import os
+import tempfile
+import time
+from unittest import mock
+
+from benchmarks.common import create_database, destroy_database, percentiles, setup_django, write_report
+
+MODES = ('off', 'sync', 'async')
+
+
+def measure(client, user_ids, repeat, mode):
+    from django.urls import reverse
+
+    from orgapp import audit
+    from orgapp.models import AuditLog
+
+    before = AuditLog.objects.count()
+    samples = []
+    for index in range(repeat):
+        url = reverse('user-detail', args=[user_ids[index % len(user_ids)]])
+        data = {'first_name': '%s-%d' % (mode, index)}
+        started = time.perf_counter()
+        response = client.patch(url, data, format='json')
+        samples.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise SystemExit('%s returned %s' % (url, response.status_code))
+    started = time.perf_counter()
+    audit.flush()
+    result = percentiles(samples)
+    result['flush_ms'] = round((time.perf_counter() - started) * 1000, 3)
+    result['entries'] = AuditLog.objects.count() - before
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--organizations', type=int, default=10)
+    parser.add_argument('--roles-per-organization', type=int, default=10)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--roles-per-user', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=500, help='Requests per mode.')
+    parser.add_argument('--database-file', help='Keep the benchmark database in this file.')
+    parser.add_argument('--output', help='Write the JSON report to this file.')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from rest_framework.test import APIClient
+
+    from benchmarks.seed import seed
+    from orgapp import audit
+    from orgapp.models import Organization, User
+
+    database_file = args.database_file
+    if database_file is None:
+        handle, database_file = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+    old_name = settings.DATABASES['default']['NAME']
+    settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['testserver']
+    create_database(database_file)
+    try:
+        dataset = seed(
+            organizations=args.organizations,
+            roles_per_organization=args.roles_per_organization,
+            users=args.users,
+            roles_per_user=args.roles_per_user,
+        )
+        superuser = User.objects.create_superuser(
+            username='bench-superuser', email='bench-superuser@example.com', password='password',
+            organization=Organization.objects.order_by('id').first(),
+        )
+        user_ids = list(User.objects.exclude(pk=superuser.pk).order_by('id').values_list('id', flat=True))
+        client = APIClient()
+        client.force_login(superuser)
+
+        results = {}
+        for mode in MODES:
+            if mode == 'off':
+                with mock.patch('orgapp.audit.record'):
+                    results[mode] = measure(client, user_ids, args.requests, mode)
+            else:
+                settings.ORGAPP_AUDIT_ASYNC = mode == 'async'
+                results[mode] = measure(client, user_ids, args.requests, mode)
+            print('%-6s p50=%8.3fms p99=%8.3fms flush=%8.3fms entries=%d' % (
+                mode, results[mode]['p50_ms'], results[mode]['p99_ms'], results[mode]['flush_ms'],
+                results[mode]['entries'],
+            ))
+        audit.shutdown()
+    finally:
+        destroy_database(old_name)
+        if args.database_file is None and os.path.exists(database_file):
+            os.remove(database_file)
+
+    write_report({'dataset': dataset, 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Benchmarks never touch ``db.sqlite3``: they run against a throwaway test
+database created with Django's test database machinery, in memory by
+default or in the file given with ``--database-file``.
+"""
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    if str(PROJECT_DIR) not in sys.path:
+        sys.path.insert(0, str(PROJECT_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'organization_management.settings')
+    import django
+
+    django.setup()
+
+
+def create_database(database_file=None):
+    from django.conf import settings
+    from django.db import connection
+
+    if database_file:
+        settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = database_file
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+
+def destroy_database(old_name):
+    from django.db import connection
+
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def percentiles(samples):
+    """
+    Returns p50/p95/p99, mean and max of ``samples`` (seconds) in milliseconds.
+    """
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(fraction):
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+    return {
+        'p50_ms': round(pick(0.50) * 1000, 3),
+        'p95_ms': round(pick(0.95) * 1000, 3),
+        'p99_ms': round(pick(0.99) * 1000, 3),
+        'mean_ms': round(statistics.mean(ordered) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def write_report(report, output=None):
+    text = json.dumps(report, indent=2, default=str)
+    if output:
+        Path(output).write_text(text + '\n')
+    else:
+        print(text)
@@ -0,0 +1,101 @@
+"""
+Query plans and latency of the hot lookups before and after the indexes
+added in ``orgapp/migrations/0003_role_indexes.py``.
+
+    python -m benchmarks.index_plans --users 1000000 --output index_plans.json
+
+The schema is migrated back to 0002, seeded, measured, migrated forward to
+0003 and measured again on the same data. Seeding and lookups go through the
+historical models of those migrations, since the current models have
+columns the 0002 and 0003 schemas lack.
+"""
+import argparse
+import time
+
+from benchmarks.common import create_database, destroy_database, percentiles, setup_django, timed, write_report
+
+BEFORE = '0002_alter_user_organization'
+AFTER = '0003_role_indexes'
+
+
+def migration_apps(target):
+    from django.db import connection
+    from django.db.migrations.executor import MigrationExecutor
+
+    return MigrationExecutor(connection).loader.project_state(('orgapp', target)).apps
+
+
+def lookups(apps):
+    Organization = apps.get_model('orgapp', 'Organization')
+    Role = apps.get_model('orgapp', 'Role')
+    User = apps.get_model('orgapp', 'User')
+
+    organization_id = Organization.objects.order_by('-id').values_list('id', flat=True).first()
+    user = User.objects.filter(organization_id=organization_id).order_by('-id').first()
+    return {
+        'role_by_name': Role.objects.filter(name='Manager'),
+        'role_by_organization_and_name': Role.objects.filter(organization_id=organization_id, name='Manager'),
+        'user_role_names': user.roles.values_list('name', flat=True),
+        'users_with_role_name': User.objects.filter(roles__name='Manager', organization_id=organization_id).order_by('id')[:100],
+        'users_in_organization': User.objects.filter(organization_id=organization_id).order_by('id')[:100],
+    }
+
+
+def measure(repeat, apps):
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    results = {}
+    for name, queryset in lookups(apps).items():
+        results[name] = {
+            'plan': queryset.explain(),
+            'latency': percentiles(timed(lambda: list(queryset.all()), repeat)),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--organizations', type=int, default=10)
+    parser.add_argument('--roles-per-organization', type=int, default=100)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--database-file', help='Keep the benchmark database in this file instead of memory.')
+    parser.add_argument('--output', help='Write the JSON report to this file.')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.core.management import call_command
+
+    from benchmarks.seed import seed
+
+    old_name = settings.DATABASES['default']['NAME']
+    create_database(args.database_file)
+    try:
+        call_command('migrate', 'orgapp', BEFORE, verbosity=0)
+        dataset = seed(
+            organizations=args.organizations,
+            roles_per_organization=args.roles_per_organization,
+            users=args.users,
+            apps=migration_apps(BEFORE),
+        )
+        before = measure(args.repeat, migration_apps(BEFORE))
+        started = time.perf_counter()
+        call_command('migrate', 'orgapp', AFTER, verbosity=0)
+        migration_seconds = time.perf_counter() - started
+        after = measure(args.repeat, migration_apps(AFTER))
+    finally:
+        destroy_database(old_name)
+
+    write_report({
+        'dataset': dataset,
+        'migration_seconds': round(migration_seconds, 3),
+        'before': before,
+        'after': after,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
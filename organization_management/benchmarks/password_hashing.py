@@ -0,0 +1,75 @@
+"""
+Password hashing throughput of ``orgapp.hashing.hash_passwords`` against the
+number of worker processes.
+
+    python -m benchmarks.password_hashing --passwords 512 --workers 1,2,4,8 \\
+        --output password_hashing.json
+
+Each level hashes the same batch with ``ORGAPP_PASSWORD_HASH_WORKERS`` set to
+that many processes; one worker is the in-process path used before pooling.
+The pool is started (and timed separately) before each measured run, so the
+figures show steady-state hashing. Speedup is relative to one worker and
+cannot exceed the number of physical cores.
+"""
+import argparse
+import os
+import time
+
+from benchmarks.common import setup_django, write_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--passwords', type=int, default=256)
+    parser.add_argument(
+        '--workers', type=lambda value: [int(level) for level in value.split(',')],
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+    )
+    parser.add_argument('--output', help='Write the JSON report to this file.')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth.hashers import get_hasher
+
+    from orgapp import hashing
+
+    passwords = ['bench-password-%d' % index for index in range(args.passwords)]
+    settings.ORGAPP_PASSWORD_HASH_POOL_MIN = 2
+    results = {}
+    for workers in args.workers:
+        settings.ORGAPP_PASSWORD_HASH_WORKERS = workers
+        hashing.shutdown()
+        started = time.perf_counter()
+        if workers > 1:
+            # Starts every worker process before the measured run.
+            hashing.hash_passwords(['warm-up'] * workers * 2)
+        startup = time.perf_counter() - started
+
+        started = time.perf_counter()
+        hashing.hash_passwords(passwords)
+        elapsed = time.perf_counter() - started
+        throughput = args.passwords / elapsed
+        results[str(workers)] = {
+            'seconds': round(elapsed, 3),
+            'hashes_per_second': round(throughput, 2),
+            'pool_startup_seconds': round(startup, 3),
+        }
+        print('workers=%-3d %8.2f hashes/s  %.3fs  (pool startup %.3fs)' % (workers, throughput, elapsed, startup))
+    hashing.shutdown()
+
+    if '1' in results:
+        for level in results.values():
+            level['speedup'] = round(results['1']['seconds'] / level['seconds'], 2)
+
+    write_report({
+        'passwords': args.passwords,
+        'hasher': get_hasher().algorithm,
+        'iterations': getattr(get_hasher(), 'iterations', None),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
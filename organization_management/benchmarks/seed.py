@@ -0,0 +1,98 @@
+"""
+Bulk seeding of organizations, roles and users for benchmarks.
+"""
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+
+# Every seeded user shares one precomputed hash so seeding is not bound by
+# the password hasher.
+SEED_PASSWORD = 'password'
+
+
+def role_names(count):
+    names = ['Manager', 'Member']
+    names.extend('Role%d' % index for index in range(len(names), count))
+    return names[:count]
+
+
+def seed(organizations=10, roles_per_organization=100, users=100000, roles_per_user=1,
+         batch_size=5000, log=print, apps=None):
+    """
+    Seeds through the models in ``apps``: the current ones by default, or the
+    historical ones of a migration state when the schema is migrated back.
+    """
+    if apps is None:
+        from django.apps import apps
+    Organization = apps.get_model('orgapp', 'Organization')
+    Role = apps.get_model('orgapp', 'Role')
+    User = apps.get_model('orgapp', 'User')
+
+    started = time.perf_counter()
+    with transaction.atomic():
+        Organization.objects.bulk_create(
+            [Organization(name='Org%d' % index, description='Seeded') for index in range(organizations)],
+            batch_size=batch_size,
+        )
+        # bulk_create skips Organization.save(), which fills in the path.
+        # Schemas from before 0004 have no path.
+        if any(field.name == 'path' for field in Organization._meta.fields):
+            Organization.objects.filter(path='').update(
+                path=Concat(Value('/'), Cast('id', CharField()), Value('/')),
+            )
+        organization_ids = list(Organization.objects.order_by('id').values_list('id', flat=True))
+        Role.objects.bulk_create(
+            [
+                Role(name=name, description='Seeded', organization_id=organization_id)
+                for organization_id in organization_ids
+                for name in role_names(roles_per_organization)
+            ],
+            batch_size=batch_size,
+        )
+        roles_by_organization = {}
+        for role_id, organization_id in Role.objects.order_by('id').values_list('id', 'organization_id'):
+            roles_by_organization.setdefault(organization_id, []).append(role_id)
+    log('seeded %d organizations and %d roles' % (organizations, organizations * roles_per_organization))
+
+    password = make_password(SEED_PASSWORD)
+    through = User.roles.through
+    first_id = (User.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+    for start in range(0, users, batch_size):
+        stop = min(start + batch_size, users)
+        with transaction.atomic():
+            batch = []
+            memberships = []
+            for index in range(start, stop):
+                organization_id = organization_ids[index % len(organization_ids)]
+                user_id = first_id + index
+                batch.append(User(
+                    id=user_id,
+                    username='user%d' % index,
+                    email='user%d@example.com' % index,
+                    first_name='First%d' % index,
+                    last_name='Last%d' % index,
+                    password=password,
+                    organization_id=organization_id,
+                ))
+                organization_roles = roles_by_organization[organization_id]
+                for offset in range(min(roles_per_user, len(organization_roles))):
+                    role_id = organization_roles[(index // len(organization_ids) + offset) % len(organization_roles)]
+                    memberships.append(through(user_id=user_id, role_id=role_id))
+            User.objects.bulk_create(batch, batch_size=batch_size)
+            through.objects.bulk_create(memberships, batch_size=batch_size)
+        if stop % (batch_size * 20) == 0 or stop == users:
+            log('seeded %d/%d users' % (stop, users))
+
+    with connection.cursor() as cursor:
+        if connection.vendor in ('sqlite', 'postgresql'):
+            cursor.execute('ANALYZE')
+    log('seeding took %.1fs' % (time.perf_counter() - started))
+    return {
+        'organizations': organizations,
+        'roles': organizations * roles_per_organization,
+        'users': users,
+        'roles_per_user': roles_per_user,
+    }
@@ -0,0 +1,113 @@
+"""
+Per-row cost of list serialization and rendering, through the regular
+serializers and through the ``orgapp.fast`` path.
+
+    python -m benchmarks.serializers --users 20000 --page-size 1000 \\
+        --repeat 20 --output serializers.json
+
+For each resource a page of ``--page-size`` rows is fetched from the
+viewset's queryset, turned into data by ``ModelSerializer`` (slow) or
+``RowBuilder`` over ``values()`` (fast), and rendered by ``JSONRenderer``
+(slow) or ``FastJSONRenderer`` (fast). Query time is included in the
+serialize step, as both paths issue their own queries. The rendered bytes of
+both paths are compared before anything is timed.
+"""
+import argparse
+import statistics
+
+from benchmarks.common import create_database, destroy_database, setup_django, timed, write_report
+
+
+def per_row_us(samples, rows):
+    return round(statistics.median(samples) / rows * 1e6, 3)
+
+
+def measure(name, queryset, serializer_class, page_size, repeat):
+    from rest_framework.renderers import JSONRenderer
+
+    from orgapp.fast import RowBuilder
+    from orgapp.renderers import FastJSONRenderer
+
+    queryset = queryset.order_by('id')
+    builder = RowBuilder(serializer_class(), queryset)
+    renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+
+    def slow_data():
+        return serializer_class(list(queryset[:page_size]), many=True).data
+
+    def fast_data():
+        return builder.build(list(queryset.prefetch_related(None).values(*builder.columns)[:page_size]))
+
+    slow, fast = slow_data(), fast_data()
+    rows = len(slow)
+    if renderer.render(slow) != fast_renderer.render(fast):
+        raise SystemExit('%s: fast path output differs from the serializer' % name)
+
+    result = {
+        'rows': rows,
+        'serialize_us_per_row': {
+            'serializer': per_row_us(timed(slow_data, repeat), rows),
+            'values': per_row_us(timed(fast_data, repeat), rows),
+        },
+        'render_us_per_row': {
+            'json': per_row_us(timed(lambda: renderer.render(slow), repeat), rows),
+            'fast_json': per_row_us(timed(lambda: fast_renderer.render(fast), repeat), rows),
+        },
+    }
+    before = result['serialize_us_per_row']['serializer'] + result['render_us_per_row']['json']
+    after = result['serialize_us_per_row']['values'] + result['render_us_per_row']['fast_json']
+    result['total_us_per_row'] = {'before': round(before, 3), 'after': round(after, 3)}
+    result['speedup'] = round(before / after, 2)
+    print('%-13s %6d rows  serialize %7.2f -> %6.2f us/row  render %6.2f -> %5.2f us/row  total %.2fx' % (
+        name, rows,
+        result['serialize_us_per_row']['serializer'], result['serialize_us_per_row']['values'],
+        result['render_us_per_row']['json'], result['render_us_per_row']['fast_json'],
+        result['speedup'],
+    ))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--organizations', type=int, default=10)
+    parser.add_argument('--roles-per-organization', type=int, default=100)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--roles-per-user', type=int, default=2)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help='Write the JSON report to this file.')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+
+    from benchmarks.seed import seed
+    from orgapp.views import OrganizationViewSet, RoleViewSet, UserViewSet
+
+    old_name = settings.DATABASES['default']['NAME']
+    create_database()
+    try:
+        dataset = seed(
+            organizations=args.organizations,
+            roles_per_organization=args.roles_per_organization,
+            users=args.users,
+            roles_per_user=args.roles_per_user,
+        )
+        results = {
+            name: measure(
+                name, viewset.queryset.annotate(**viewset.field_annotations), viewset.serializer_class,
+                args.page_size, args.repeat,
+            )
+            for name, viewset in (
+                ('organizations', OrganizationViewSet),
+                ('roles', RoleViewSet),
+                ('users', UserViewSet),
+            )
+        }
+    finally:
+        destroy_database(old_name)
+    write_report({'dataset': dataset, 'page_size': args.page_size, 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
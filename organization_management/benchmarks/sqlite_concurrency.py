@@ -0,0 +1,142 @@
+"""
+Read latency while a writer holds the SQLite write lock, in rollback-journal
+mode against WAL mode.
+
+    python -m benchmarks.sqlite_concurrency --readers 8 --seconds 5 \\
+        --hold-ms 20 --idle-ms 20 --output sqlite_concurrency.json
+
+Uses the sqlite3 module directly on a temporary file, with the pragmas from
+``ORGAPP_SQLITE_PRAGMAS`` apart from the journal mode under test. One writer
+thread repeatedly runs ``BEGIN EXCLUSIVE``, inserts a batch of rows and holds
+the lock for ``--hold-ms`` before committing, then idles for ``--idle-ms``;
+``--readers`` threads count rows in a loop with busy_timeout set to 0, so a
+read that would have to wait for the writer fails at once and is counted as
+blocked. In rollback-journal mode every read that overlaps a write
+transaction is blocked; in WAL mode reads see the last committed snapshot
+and none are. Latency figures include GIL contention between the threads.
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from benchmarks.common import percentiles, setup_django, write_report
+
+MODES = ('DELETE', 'WAL')
+
+
+def run_mode(journal_mode, pragmas, readers, seconds, hold, idle, batch):
+    from orgapp.sqlite import configure
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'stress.sqlite3')
+    pragmas = dict(pragmas, journal_mode=journal_mode)
+
+    def connect(**overrides):
+        connection = sqlite3.connect(path, timeout=0, isolation_level=None, check_same_thread=False)
+        configure(connection, dict(pragmas, **overrides))
+        return connection
+
+    setup = connect()
+    setup.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, payload TEXT)')
+    setup.close()
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    read_samples = []
+    blocked = []
+    writes = []
+
+    def writer(connection):
+        rows = [('x' * 100,)] * batch
+        while not stop.is_set():
+            started = time.perf_counter()
+            connection.execute('BEGIN EXCLUSIVE')
+            connection.executemany('INSERT INTO item (payload) VALUES (?)', rows)
+            time.sleep(hold)
+            connection.execute('COMMIT')
+            writes.append(time.perf_counter() - started)
+            time.sleep(idle)
+        connection.close()
+
+    def reader(connection):
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                connection.execute('SELECT COUNT(*) FROM item').fetchone()
+            except sqlite3.OperationalError as exc:
+                if 'locked' not in str(exc):
+                    raise
+                with lock:
+                    blocked.append(1)
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                read_samples.append(elapsed)
+        connection.close()
+
+    # Connections are opened up front: setting the journal mode needs the lock.
+    threads = [threading.Thread(target=writer, args=(connect(),))] + [
+        threading.Thread(target=reader, args=(connect(busy_timeout=0),)) for _ in range(readers)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    shutil.rmtree(directory, ignore_errors=True)
+
+    result = {
+        'reads': len(read_samples),
+        'reads_per_second': round(len(read_samples) / seconds, 2),
+        'blocked_reads': len(blocked),
+        'blocked_fraction': round(len(blocked) / ((len(blocked) + len(read_samples)) or 1), 4),
+        'write_transactions': len(writes),
+        'read_latency': percentiles(read_samples),
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--hold-ms', type=float, default=20, help='How long each write transaction holds the lock.')
+    parser.add_argument('--idle-ms', type=float, default=20, help='Pause between write transactions.')
+    parser.add_argument('--batch', type=int, default=100, help='Rows inserted per write transaction.')
+    parser.add_argument('--output', help='Write the JSON report to this file.')
+    args = parser.parse_args()
+
+    setup_django()
+    from orgapp.sqlite import get_pragmas
+
+    pragmas = get_pragmas()
+    results = {}
+    for journal_mode in MODES:
+        results[journal_mode] = run_mode(
+            journal_mode, pragmas, args.readers, args.seconds, args.hold_ms / 1000, args.idle_ms / 1000, args.batch,
+        )
+        result = results[journal_mode]
+        print('%-6s reads/s=%-10s p99=%sms blocked=%d (%.1f%%) writes=%d' % (
+            journal_mode, result['reads_per_second'], result['read_latency'].get('p99_ms'),
+            result['blocked_reads'], result['blocked_fraction'] * 100, result['write_transactions'],
+        ))
+
+    write_report({
+        'readers': args.readers,
+        'seconds': args.seconds,
+        'hold_ms': args.hold_ms,
+        'idle_ms': args.idle_ms,
+        'batch': args.batch,
+        'pragmas': {name: value for name, value in pragmas.items() if name != 'journal_mode'},
+        'sqlite_version': sqlite3.sqlite_version,
+        'results': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
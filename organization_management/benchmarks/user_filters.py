@@ -0,0 +1,135 @@
+"""
+Latency and query plans of the user and role list filters.
+
+    python -m benchmarks.user_filters --users 1000000 --requests 50 \\
+        --output user_filters.json
+
+Each filter URL is requested ``--requests`` times through the API (one
+client, JWT authentication) against a seeded database. The report holds
+p50/p95/p99 latency, queries per request and ``EXPLAIN QUERY PLAN`` of the
+query that reads the page, so a filter that stops using its index shows up
+as a ``SCAN`` of the table.
+"""
+import argparse
+import time
+
+from benchmarks.common import create_database, destroy_database, percentiles, setup_django, write_report
+
+
+def build_urls(organization_id, role_id):
+    from django.urls import reverse
+
+    users = reverse('user-list')
+    return {
+        'organization': '%s?organization=%d' % (users, organization_id),
+        'organization_role_name': '%s?organization=%d&role_name=Manager' % (users, organization_id),
+        'role': '%s?role=%d' % (users, role_id),
+        'is_active': users + '?is_active=true',
+        'inactive': users + '?is_active=false',
+        'is_staff': users + '?is_staff=true',
+        'username_prefix': users + '?username=user12345',
+        'email_prefix': users + '?email=user99',
+        'search_one_user': users + '?search=First123456',
+        'search_common_prefix': users + '?search=Last1',
+        'search_two_words': users + '?search=first99+last99',
+        'search_no_match': users + '?search=nobody',
+        'role_name_prefix': reverse('role-list') + '?name=Man',
+    }
+
+
+def page_plan(captured):
+    from django.db import connection
+
+    page_queries = [query['sql'] for query in captured if 'LIMIT' in query['sql']]
+    if not page_queries:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + page_queries[0])
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def measure(client, url, repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    response = client.get(url)
+    if response.status_code != 200:
+        raise SystemExit('%s returned %s' % (url, response.status_code))
+    samples = []
+    queries = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            samples.append(time.perf_counter() - started)
+        queries.append(len(captured.captured_queries))
+    result = {
+        'url': url,
+        'rows': len(response.json()['results']),
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+        'plan': page_plan(captured.captured_queries),
+    }
+    result.update(percentiles(samples))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--organizations', type=int, default=10)
+    parser.add_argument('--roles-per-organization', type=int, default=100)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--roles-per-user', type=int, default=1)
+    parser.add_argument('--inactive-every', type=int, default=1000, help='Deactivate every n-th seeded user.')
+    parser.add_argument('--requests', type=int, default=50, help='Requests per URL.')
+    parser.add_argument('--database-file', help='Keep the benchmark database in this file instead of memory.')
+    parser.add_argument('--output', help='Write the JSON report to this file.')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    from benchmarks.api import access_token
+    from benchmarks.seed import seed
+    from orgapp.models import Organization, Role, User
+
+    old_name = settings.DATABASES['default']['NAME']
+    settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['testserver']
+    # Every request must reach the database.
+    settings.ORGAPP_RESPONSE_CACHE_TIMEOUT = 0
+    create_database(args.database_file)
+    try:
+        dataset = seed(
+            organizations=args.organizations,
+            roles_per_organization=args.roles_per_organization,
+            users=args.users,
+            roles_per_user=args.roles_per_user,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE orgapp_user SET is_active = 0 WHERE id %% %s = 0', [args.inactive_every])
+            cursor.execute('ANALYZE')
+        organization = Organization.objects.order_by('-id').first()
+        superuser = User.objects.create_superuser(
+            username='bench-superuser', email='bench-superuser@example.com', password='password',
+            organization=organization,
+        )
+        role_id = Role.objects.filter(organization=organization).order_by('id').values_list('id', flat=True).first()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + access_token(superuser))
+
+        results = {}
+        for name, url in build_urls(organization.id, role_id).items():
+            results[name] = measure(client, url, args.requests)
+            print('%-24s p50=%8.3fms p99=%8.3fms rows=%-4d %s' % (
+                name, results[name]['p50_ms'], results[name]['p99_ms'], results[name]['rows'],
+                ' | '.join(results[name]['plan'] or []),
+            ))
+    finally:
+        destroy_database(old_name)
+
+    write_report({'dataset': dataset, 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
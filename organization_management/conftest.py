@@ -0,0 +1,23 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # Test databases are rolled back without firing signals and primary keys
+    # get reused, so cached entries must not leak between tests.
+    from django.core.cache import caches
+    from orgapp import role_cache
+
+    for cache in caches.all():
+        cache.clear()
+    role_cache.stats.reset()
+    yield
+    for cache in caches.all():
+        cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def synchronous_audit(settings):
+    # Write audit entries inside the test's transaction, where they are
+    # visible to assertions and rolled back with everything else.
+    settings.ORGAPP_AUDIT_ASYNC = False
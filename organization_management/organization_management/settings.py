@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,14 +44,26 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'orgapp.middleware.QueryProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'orgapp.middleware.ReplicaPinningMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request SQL profiling for API routes, reported in the Server-Timing
+# header and on the 'orgapp.queries' logger. Statements repeated at least
+# DUPLICATE_THRESHOLD times in one request are flagged as likely N+1.
+ORGAPP_QUERY_PROFILING = {
+    'ENABLED': False,
+    'PATH_PREFIXES': ['/api/'],
+    'DUPLICATE_THRESHOLD': 5,
+    'SLOWEST': 3,
+}
+
 ROOT_URLCONF = 'organization_management.urls'
 
 TEMPLATES = [
@@ -79,13 +92,145 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Stand-in read replica for local testing: point NAME at a copy of the
+    # primary and add the alias to ORGAPP_DATABASE_REPLICAS. Tests mirror it
+    # onto the test database of 'default'.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db-replica.sqlite3',
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+}
+
+# list/retrieve actions of the orgapp viewsets read from these aliases;
+# writes and everything else use 'default'. A user who just wrote something
+# reads from 'default' for ORGAPP_REPLICA_STICKY_SECONDS. The pin is kept in
+# the ORGAPP_REPLICA_CACHE cache, which has to be shared by all worker
+# processes (Redis, Memcached) once there is more than one.
+DATABASE_ROUTERS = ['orgapp.routers.ReplicaRouter']
+ORGAPP_DATABASE_REPLICAS = []
+ORGAPP_REPLICA_STICKY_SECONDS = 5
+ORGAPP_REPLICA_CACHE = 'default'
+
+# Applied to every new SQLite connection by orgapp.sqlite. busy_timeout (ms)
+# makes writers wait for the lock instead of failing with "database is
+# locked". Deployments should add 'journal_mode': 'WAL', which lets reads run
+# while a write is in progress; it is left out here because it is written
+# into the database file and would modify the committed db.sqlite3.
+ORGAPP_SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
 }
 
+# Write transactions are serialized within the process and retried this many
+# times, backing off exponentially from ORGAPP_SQLITE_WRITE_BACKOFF seconds,
+# when another process holds the lock.
+ORGAPP_SQLITE_WRITE_RETRIES = 5
+ORGAPP_SQLITE_WRITE_BACKOFF = 0.05
+
 
 AUTH_USER_MODEL = 'orgapp.User'
 
 
+# Threads serving the /api/async/ read routes under ASGI.
+ORGAPP_ASYNC_WORKERS = 32
+
+# Processes hashing passwords for bulk user creation and imports, per web
+# process (None: half the CPUs, at most 4). Batches under
+# ORGAPP_PASSWORD_HASH_POOL_MIN are hashed in process.
+ORGAPP_PASSWORD_HASH_WORKERS = None
+ORGAPP_PASSWORD_HASH_POOL_MIN = 8
+
+
+# Caches
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# Role names per user, read by the IsManager / IsMember permission classes,
+# and the token versions that revoke JWT access tokens. Changes evict entries
+# only in the cache they run against, so with more than one worker process
+# this has to be a shared backend (Redis, Memcached) instead of locmem.
+ORGAPP_ROLE_CACHE = 'roles'
+ORGAPP_ROLE_CACHE_TIMEOUT = 300
+ORGAPP_ROLE_CACHE_MAX_ENTRIES = 10000
+
+# Lifetime of the cached /api/organizations/<id>/summary/ payload.
+ORGAPP_SUMMARY_CACHE_TIMEOUT = 60
+
+# Serialized organization and role lists. Entries are keyed on the table
+# version tokens, so writes invalidate them immediately; the timeout only
+# bounds how long stale entries stay in memory. Concurrent misses wait up
+# to ORGAPP_RESPONSE_CACHE_WAIT seconds for a single recompute.
+ORGAPP_RESPONSE_CACHE = 'default'
+ORGAPP_RESPONSE_CACHE_TIMEOUT = 300
+ORGAPP_RESPONSE_CACHE_WAIT = 5
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    ORGAPP_ROLE_CACHE: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'orgapp-roles',
+        'TIMEOUT': ORGAPP_ROLE_CACHE_TIMEOUT,
+        'OPTIONS': {
+            'MAX_ENTRIES': ORGAPP_ROLE_CACHE_MAX_ENTRIES,
+        },
+    },
+}
+
+
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'orgapp.authentication.ClaimsJWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'orgapp.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'orgapp.pagination.IdCursorPagination',
+    'PAGE_SIZE': 100,
+}
+
+# Access tokens carry the user's roles and are checked against
+# User.token_version, so keep their lifetime short; clients refresh them.
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    'TOKEN_USER_CLASS': 'orgapp.authentication.ClaimsUser',
+    'TOKEN_OBTAIN_SERIALIZER': 'orgapp.authentication.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'orgapp.authentication.ClaimsTokenRefreshSerializer',
+}
+
+# Upper bound for the ``page_size`` query parameter.
+ORGAPP_MAX_PAGE_SIZE = 1000
+
+# Build JSON list responses from values() rows instead of serializer
+# instances (orgapp.fast); the output is byte-for-byte the same.
+ORGAPP_FAST_LIST_SERIALIZERS = True
+
+# Audit log (orgapp.audit). Entries are written by a background thread in
+# batches of ORGAPP_AUDIT_BATCH_SIZE, waiting up to ORGAPP_AUDIT_FLUSH_INTERVAL
+# seconds to fill one. Once ORGAPP_AUDIT_QUEUE_SIZE entries are pending,
+# requests wait up to ORGAPP_AUDIT_BLOCK_TIMEOUT seconds for room and then
+# write their own entries. ORGAPP_AUDIT_ASYNC = False writes them in the
+# request's transaction instead.
+ORGAPP_AUDIT_ASYNC = True
+ORGAPP_AUDIT_BATCH_SIZE = 500
+ORGAPP_AUDIT_FLUSH_INTERVAL = 0.2
+ORGAPP_AUDIT_QUEUE_SIZE = 10000
+ORGAPP_AUDIT_BLOCK_TIMEOUT = 1.0
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,60 @@
+"""
+Async entry points for the read-only organization, role and user routes.
+
+Under ASGI, Django 3.2 runs every sync view on one shared thread, so slow
+requests queue behind each other. These views await the regular DRF
+viewset actions in a bounded thread pool instead, so up to
+``ORGAPP_ASYNC_WORKERS`` reads run in parallel while the event loop keeps
+accepting connections. Authentication, permissions, pagination and
+serialization are exactly those of the sync routes.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'ORGAPP_ASYNC_WORKERS', 32),
+                    thread_name_prefix='orgapp-async',
+                )
+    return _executor
+
+
+def _call(view, request, *args, **kwargs):
+    # Worker threads outlive requests, so apply CONN_MAX_AGE the way
+    # request_started/request_finished do for regular views.
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+async def run_in_pool(view, request, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(_call, view, request, *args, **kwargs))
+
+
+def async_view(viewset, actions, basename):
+    sync_view = viewset.as_view(actions, basename=basename)
+
+    async def view(request, *args, **kwargs):
+        return await run_in_pool(sync_view, request, *args, **kwargs)
+
+    view.csrf_exempt = True
+    return view
@@ -0,0 +1,264 @@
+"""
+Audit trail of changes made through the API.
+
+Each write builds ``AuditLog`` entries holding the actor, the changed
+object and a diff of its fields (``snapshot`` before and after, then
+``diff``). ``record`` hands them, once the surrounding transaction commits,
+to a background thread that inserts them in batches of up to
+``ORGAPP_AUDIT_BATCH_SIZE``, lingering ``ORGAPP_AUDIT_FLUSH_INTERVAL``
+seconds to fill a batch, so requests never wait on the insert.
+
+The queue holds at most ``ORGAPP_AUDIT_QUEUE_SIZE`` entries. When it is
+full, a request blocks for up to ``ORGAPP_AUDIT_BLOCK_TIMEOUT`` seconds and
+then writes its entries itself, which slows writers down to the rate the
+database takes audit rows instead of dropping them. Entries still queued at
+exit are written by an ``atexit`` hook. With ``ORGAPP_AUDIT_ASYNC`` off,
+entries are inserted in the current transaction instead.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import AuditLog, month_key
+from .sqlite import run_write
+
+logger = logging.getLogger(__name__)
+
+CREATE = AuditLog.CREATE
+UPDATE = AuditLog.UPDATE
+DELETE = AuditLog.DELETE
+
+# Bookkeeping columns that change without anyone editing the object, and
+# the auth relations the API does not manage.
+EXCLUDED_FIELDS = ('last_login', 'token_version', 'groups', 'user_permissions')
+REDACTED_FIELDS = ('password',)
+REDACTED = '<redacted>'
+
+_STOP = object()
+
+
+def snapshot(instance, related=None):
+    """
+    Returns the audited field values of ``instance``: concrete fields by
+    attribute name and many-to-many fields as sets of primary keys, read
+    from prefetched objects when available. ``related`` supplies known
+    many-to-many values instead.
+    """
+    related = related or {}
+    values = {}
+    for field in instance._meta.concrete_fields:
+        if field.name not in EXCLUDED_FIELDS:
+            values[field.attname] = field.value_from_object(instance)
+    for field in instance._meta.many_to_many:
+        if field.name in EXCLUDED_FIELDS:
+            continue
+        if field.name in related:
+            values[field.name] = frozenset(related[field.name])
+        else:
+            values[field.name] = frozenset(related_object.pk for related_object in getattr(instance, field.name).all())
+    return values
+
+
+def diff(before, after):
+    """
+    Returns the changes between two snapshots, ``{}`` for none. Either
+    snapshot may be empty, for a created or deleted object.
+    """
+    changes = {}
+    for name in dict.fromkeys([*before, *after]):
+        old, new = before.get(name), after.get(name)
+        if isinstance(old, frozenset) or isinstance(new, frozenset):
+            old, new = old or frozenset(), new or frozenset()
+            if old != new:
+                changes[name] = {'added': sorted(new - old), 'removed': sorted(old - new)}
+        elif old != new:
+            if name in REDACTED_FIELDS:
+                old, new = old and REDACTED, new and REDACTED
+            changes[name] = [old, new]
+    return changes
+
+
+def build_entry(actor, action, resource, object_id, changes):
+    created_at = timezone.now()
+    authenticated = actor is not None and actor.is_authenticated
+    return AuditLog(
+        created_at=created_at,
+        month=month_key(created_at),
+        actor_id=actor.pk if authenticated else None,
+        actor_username=actor.username if authenticated else '',
+        action=action,
+        resource=resource,
+        object_id=object_id,
+        changes=changes,
+    )
+
+
+def log_change(actor, action, instance, before=None, after=None, object_id=None):
+    """
+    Records the change of ``instance`` between the ``before`` and ``after``
+    snapshots; updates that changed nothing are skipped.
+    """
+    changes = diff(before or {}, after or {})
+    if action == UPDATE and not changes:
+        return
+    record([build_entry(actor, action, instance._meta.model_name, object_id or instance.pk, changes)])
+
+
+def write(entries):
+    run_write(AuditLog.objects.bulk_create, entries, batch_size=get_batch_size())
+
+
+def get_batch_size():
+    return getattr(settings, 'ORGAPP_AUDIT_BATCH_SIZE', 500)
+
+
+class AuditWriter:
+    """
+    Bounded queue of entries drained by one daemon thread.
+    """
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.written = 0
+        self.fallbacks = 0
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='orgapp-audit', daemon=True)
+                self.thread.start()
+
+    def put(self, entries):
+        self.start()
+        timeout = getattr(settings, 'ORGAPP_AUDIT_BLOCK_TIMEOUT', 1.0)
+        for index, entry in enumerate(entries):
+            try:
+                self.queue.put(entry, timeout=timeout)
+            except queue.Full:
+                pending = entries[index:]
+                logger.warning('Audit queue full; writing %d entries synchronously.', len(pending))
+                self.fallbacks += 1
+                write(pending)
+                return
+
+    def next_batch(self):
+        entry = self.queue.get()
+        if entry is _STOP:
+            return None, True
+        batch = [entry]
+        deadline = time.monotonic() + getattr(settings, 'ORGAPP_AUDIT_FLUSH_INTERVAL', 0.2)
+        limit = get_batch_size()
+        while len(batch) < limit:
+            try:
+                entry = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def run(self):
+        try:
+            while True:
+                batch, stop = self.next_batch()
+                if batch:
+                    try:
+                        write(batch)
+                        self.written += len(batch)
+                    except Exception:
+                        logger.exception('Could not write %d audit entries.', len(batch))
+                    finally:
+                        for _ in batch:
+                            self.queue.task_done()
+                if stop:
+                    self.queue.task_done()
+                    return
+        finally:
+            connections.close_all()
+
+    def flush(self):
+        """
+        Waits until every queued entry has been written.
+        """
+        self.queue.join()
+
+    def stop(self, timeout=None):
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None and thread.is_alive():
+            self.queue.put(_STOP)
+            thread.join(timeout)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AuditWriter(getattr(settings, 'ORGAPP_AUDIT_QUEUE_SIZE', 10000))
+        return _writer
+
+
+def record(entries):
+    """
+    Stores ``entries``, in the background once the current transaction
+    commits unless ``ORGAPP_AUDIT_ASYNC`` is off.
+    """
+    if not entries:
+        return
+    if not getattr(settings, 'ORGAPP_AUDIT_ASYNC', True):
+        write(entries)
+        return
+    transaction.on_commit(lambda: get_writer().put(entries))
+
+
+def flush():
+    if _writer is not None:
+        _writer.flush()
+
+
+@atexit.register
+def shutdown(timeout=5):
+    """
+    Writes what is queued and stops the worker; the next ``record`` starts
+    a new one with the current settings.
+    """
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.stop(timeout)
+
+
+class AuditedWriteMixin:
+    """
+    Records the create, update and destroy steps of a viewset. Should come
+    after ``SerializedWriteMixin`` so entries join the write's transaction.
+    """
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        log_change(self.request.user, CREATE, serializer.instance, after=snapshot(serializer.instance))
+
+    def perform_update(self, serializer):
+        before = snapshot(serializer.instance)
+        super().perform_update(serializer)
+        log_change(self.request.user, UPDATE, serializer.instance, before, snapshot(serializer.instance))
+
+    def perform_destroy(self, instance):
+        before = snapshot(instance)
+        object_id = instance.pk
+        super().perform_destroy(instance)
+        log_change(self.request.user, DELETE, instance, before, object_id=object_id)
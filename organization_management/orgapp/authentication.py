@@ -0,0 +1,153 @@
+"""
+Stateless JWT authentication carrying the claims the permission classes
+need.
+
+Access tokens hold the user's id, organization id, staff flags, role names
+and role permissions, so a request authenticated with one loads neither the
+user nor their roles. Claims go stale when roles change; every such change
+bumps ``User.token_version`` (see ``revoke_tokens``), and tokens carrying an
+older version are rejected. The current version is read from the role cache,
+so the check costs one query only on a cache miss. Revocation clears that
+entry only in the cache it runs against: with several worker processes the
+role cache has to be a shared one (Redis, Memcached), or the other workers
+keep accepting revoked tokens until their entry times out. Clients get fresh claims
+from the refresh endpoint, and ``ACCESS_TOKEN_LIFETIME`` bounds how long
+anything not covered by the version (such as a changed staff flag) stays in
+effect.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import role_cache
+from .models import User
+
+VERSION_KEY_PREFIX = 'orgapp:token-version:'
+
+
+def _version_key(user_id):
+    return '%s%s' % (VERSION_KEY_PREFIX, user_id)
+
+
+def get_token_version(user_id):
+    """
+    Returns the current ``token_version`` of a user, or ``None`` if the
+    user no longer exists.
+    """
+    cache = role_cache.get_cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = User.objects.filter(pk=user_id).values_list('token_version', flat=True).first()
+        if version is not None:
+            cache.set(_version_key(user_id), version, role_cache.get_timeout())
+    return version
+
+
+def revoke_tokens(*user_ids):
+    """
+    Invalidates the access tokens issued so far to ``user_ids``.
+    """
+    if not user_ids:
+        return
+    User.objects.filter(pk__in=user_ids).update(token_version=F('token_version') + 1)
+    _forget_versions(user_ids)
+
+
+def revoke_role_tokens(*role_ids):
+    """
+    Invalidates the access tokens issued so far to the holders of
+    ``role_ids`` and returns their ids. Holders are selected with a
+    subquery, as a widely held role can have more members than SQLite
+    accepts query parameters.
+    """
+    memberships = User.roles.through.objects.filter(role_id__in=role_ids)
+    user_ids = list(memberships.values_list('user_id', flat=True).distinct())
+    if user_ids:
+        User.objects.filter(pk__in=memberships.values('user_id')).update(token_version=F('token_version') + 1)
+        _forget_versions(user_ids)
+    return user_ids
+
+
+def _forget_versions(user_ids):
+    keys = [_version_key(user_id) for user_id in user_ids]
+    role_cache.get_cache().delete_many(keys)
+    # A concurrent request may cache the old version before this commits.
+    transaction.on_commit(lambda: role_cache.get_cache().delete_many(keys))
+
+
+def get_claims(user):
+    access = role_cache.get_access(user)
+    return {
+        'username': user.username,
+        'organization_id': user.organization_id,
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
+        'roles': sorted(access.role_names),
+        'permissions': sorted(access.permissions),
+        'token_version': user.token_version,
+    }
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    Refresh token whose access tokens copy the claims of ``get_claims``.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.payload.update(get_claims(user))
+        return token
+
+
+class ClaimsUser(TokenUser):
+    """
+    Request user built from the claims of a validated access token.
+    """
+
+    @cached_property
+    def organization_id(self):
+        return self.token.get('organization_id')
+
+    @cached_property
+    def role_names(self):
+        return frozenset(self.token.get('roles', ()))
+
+    @cached_property
+    def permissions(self):
+        return frozenset(self.token.get('permissions', ()))
+
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        if validated_token.get('token_version') != get_token_version(user.id):
+            raise InvalidToken('Token has been revoked.')
+        return user
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Issues an access token with the user's current claims rather than the
+    ones copied into the refresh token when it was obtained.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.filter(pk=refresh[api_settings.USER_ID_CLAIM], is_active=True).first()
+        if user is None:
+            raise AuthenticationFailed('User not found or inactive.', code='user_not_found')
+        access = AccessToken.for_user(user)
+        access.payload.update(get_claims(user))
+        return {'access': str(access)}
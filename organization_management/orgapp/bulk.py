@@ -0,0 +1,125 @@
+"""
+Set-based user creation and role assignment for many users at once.
+
+Changes go straight to the ``User.roles`` through table with ``bulk_create``
+and a single ``DELETE`` so the query count does not grow with the number of
+users or roles.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from . import audit, hashing, role_cache, versioning
+from .authentication import revoke_tokens
+from .sqlite import run_write
+from .models import User
+
+ADD = 'add'
+REMOVE = 'remove'
+REPLACE = 'replace'
+MODES = (ADD, REMOVE, REPLACE)
+
+BATCH_SIZE = 500
+
+
+def assign_roles(user_ids, role_ids, mode, actor=None):
+    """
+    Adds, removes or replaces ``role_ids`` on every user in ``user_ids``,
+    recording the changes in the audit log as made by ``actor``.
+
+    Returns a list with the role ids added and removed for each user.
+    """
+    through = User.roles.through
+    user_ids = list(dict.fromkeys(user_ids))
+    role_ids = list(dict.fromkeys(role_ids))
+    wanted = set(role_ids)
+
+    with transaction.atomic():
+        current = defaultdict(set)
+        for user_id, role_id in through.objects.filter(user_id__in=user_ids).values_list('user_id', 'role_id'):
+            current[user_id].add(role_id)
+
+        added = {}
+        removed = {}
+        for user_id in user_ids:
+            held = current[user_id]
+            added[user_id] = [] if mode == REMOVE else [role_id for role_id in role_ids if role_id not in held]
+            if mode == ADD:
+                removed[user_id] = []
+            elif mode == REMOVE:
+                removed[user_id] = sorted(held & wanted)
+            else:
+                removed[user_id] = sorted(held - wanted)
+
+        if mode == REMOVE:
+            through.objects.filter(user_id__in=user_ids, role_id__in=role_ids).delete()
+        elif mode == REPLACE:
+            through.objects.filter(user_id__in=user_ids).exclude(role_id__in=role_ids).delete()
+
+        through.objects.bulk_create(
+            [through(user_id=user_id, role_id=role_id) for user_id in user_ids for role_id in added[user_id]],
+            batch_size=BATCH_SIZE,
+        )
+
+        # bulk_create and queryset deletes bypass m2m_changed. Evict again on
+        # commit in case a concurrent request cached the old roles meanwhile.
+        role_cache.evict(*user_ids)
+        transaction.on_commit(lambda: role_cache.evict(*user_ids))
+        revoke_tokens(*user_ids)
+        audit.record([
+            audit.build_entry(actor, audit.UPDATE, 'user', user_id, {
+                'roles': {'added': sorted(added[user_id]), 'removed': removed[user_id]},
+            })
+            for user_id in user_ids if added[user_id] or removed[user_id]
+        ])
+
+    return [
+        {'user_id': user_id, 'added': added[user_id], 'removed': removed[user_id]}
+        for user_id in user_ids
+    ]
+
+
+def create_users(rows, actor=None):
+    """
+    Creates one user per validated ``UserSerializer`` row with a single
+    ``bulk_create``, hashing all passwords in one ``hashing.hash_passwords``
+    batch before taking the write lock, and records them in the audit log as
+    created by ``actor``. Returns the created users with their primary keys
+    set.
+    """
+    rows = [dict(row) for row in rows]
+    passwords = hashing.hash_passwords([row.pop('password', None) for row in rows])
+    role_ids = [[role.pk for role in row.pop('roles', [])] for row in rows]
+    users = [User(password=password, **row) for row, password in zip(rows, passwords)]
+    if users:
+        insert_users(users, role_ids, actor=actor)
+    return users
+
+
+def insert_users(users, role_ids, actor=None, batch_size=BATCH_SIZE):
+    """
+    Inserts ``users``, whose passwords are already hashed, and their roles
+    (``role_ids`` holds one list per user) in one write transaction, and
+    records them in the audit log as created by ``actor``. Sets the users'
+    primary keys.
+    """
+    run_write(_insert_users, users, role_ids, actor, batch_size)
+    # bulk_create does not send post_save.
+    versioning.bump('user')
+
+
+def _insert_users(users, role_ids, actor, batch_size):
+    through = User.roles.through
+    User.objects.bulk_create(users, batch_size=batch_size)
+    # SQLite does not return primary keys from bulk inserts.
+    user_ids = dict(User.objects.filter(username__in=[user.username for user in users]).values_list('username', 'id'))
+    for user in users:
+        user.pk = user_ids[user.username]
+    through.objects.bulk_create(
+        [through(user_id=user.pk, role_id=role_id) for user, roles in zip(users, role_ids) for role_id in roles],
+        batch_size=batch_size,
+    )
+    audit.record([
+        audit.build_entry(actor, audit.CREATE, 'user', user.pk, audit.diff({}, audit.snapshot(user, related={'roles': roles})))
+        for user, roles in zip(users, role_ids)
+    ])
@@ -0,0 +1,46 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import versioning
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag and Last-Modified to list and retrieve responses and answers
+    ``304 Not Modified`` before any serialization happens.
+
+    Validators are derived from the version tokens of ``version_tables`` and,
+    on scoped viewsets, the caller's ``get_cache_scope()``, so an unchanged
+    resource is answered without reading the tables.
+    """
+    version_tables = ()
+
+    def get_version_tables(self):
+        return self.version_tables
+
+    def get_validators(self, request):
+        versions = [versioning.get_version(table) for table in self.get_version_tables()]
+        scope = self.get_cache_scope() if hasattr(self, 'get_cache_scope') else ''
+        parts = [self.basename, self.action, request.get_full_path(), str(request.user.pk), scope]
+        parts.extend(token for token, _ in versions)
+        etag = quote_etag(hashlib.md5('|'.join(parts).encode()).hexdigest())
+        last_modified = int(max(timestamp for _, timestamp in versions))
+        return etag, last_modified
+
+    def conditional(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
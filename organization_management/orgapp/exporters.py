@@ -0,0 +1,106 @@
+"""
+Streaming exports of organizations, roles and users.
+
+Rows are read with ``.values().iterator(chunk_size=...)`` and encoded one at
+a time, so memory use does not depend on the size of the table.
+"""
+import csv
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .importers import ROLE_SEPARATOR
+from .models import Organization, Role, User
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+FORMATS = (CSV, NDJSON)
+
+CONTENT_TYPES = {
+    CSV: 'text/csv',
+    NDJSON: 'application/x-ndjson',
+}
+
+
+def _organizations(chunk_size):
+    queryset = Organization.objects.order_by('id').values('id', 'name', 'description', 'created_at')
+    yield from queryset.iterator(chunk_size=chunk_size)
+
+
+def _roles(chunk_size):
+    queryset = Role.objects.order_by('id').values(
+        'id', 'name', 'description', 'organization_id', 'organization__name',
+    )
+    for row in queryset.iterator(chunk_size=chunk_size):
+        row['organization'] = row.pop('organization__name')
+        yield row
+
+
+def _users(chunk_size):
+    queryset = User.objects.order_by('id').values(
+        'id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff',
+        'date_joined', 'organization__name',
+    )
+    rows = queryset.iterator(chunk_size=chunk_size)
+    through = User.roles.through
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        role_names = {}
+        memberships = through.objects.filter(
+            user_id__in=[row['id'] for row in chunk],
+        ).order_by('role_id').values_list('user_id', 'role__name')
+        for user_id, role_name in memberships:
+            role_names.setdefault(user_id, []).append(role_name)
+        for row in chunk:
+            row['organization'] = row.pop('organization__name')
+            row['roles'] = role_names.get(row['id'], [])
+            yield row
+
+
+RESOURCES = {
+    'organizations': _organizations,
+    'roles': _roles,
+    'users': _users,
+}
+
+COLUMNS = {
+    'organizations': ('id', 'name', 'description', 'created_at'),
+    'roles': ('id', 'name', 'description', 'organization_id', 'organization'),
+    'users': (
+        'id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff',
+        'date_joined', 'organization', 'roles',
+    ),
+}
+
+
+def iter_records(resource, chunk_size=2000):
+    return RESOURCES[resource](chunk_size)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def iter_ndjson(records):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for record in records:
+        yield encoder.encode(record) + '\n'
+
+
+def iter_csv(records, columns):
+    writer = csv.DictWriter(_Echo(), fieldnames=columns)
+    yield writer.writeheader()
+    for record in records:
+        if 'roles' in record:
+            record['roles'] = ROLE_SEPARATOR.join(record['roles'])
+        yield writer.writerow(record)
+
+
+def iter_export(resource, file_format, chunk_size=2000):
+    records = iter_records(resource, chunk_size)
+    if file_format == CSV:
+        return iter_csv(records, COLUMNS[resource])
+    return iter_ndjson(records)
@@ -0,0 +1,159 @@
+"""
+Read-only fast path for list responses.
+
+``RowBuilder`` turns a ``ModelSerializer``'s readable fields into a plan for
+``QuerySet.values()``: plain integer, string and boolean fields are copied as
+they come from the database, foreign keys read their ``<name>_id`` column,
+other fields keep their own ``to_representation``, and many-to-many primary
+key fields are filled from one extra query per field, issued the same way
+``prefetch_related`` does so the ids come back in the same order. The rows
+equal ``serializer.data`` for the same instances, so the rendered bytes match
+too. Serializers the plan cannot express (method fields, dotted or ``*``
+sources, nested serializers, non-pk related fields) keep using the regular serializer.
+"""
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField, RelatedField
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+# to_representation methods that return a database value unchanged.
+IDENTITY_REPRESENTATIONS = (
+    serializers.IntegerField.to_representation,
+    serializers.CharField.to_representation,
+    serializers.BooleanField.to_representation,
+)
+
+SCALAR = 'scalar'
+MANY = 'many'
+
+
+def is_plain_pk_field(field):
+    """
+    Whether ``field`` represents an instance by its bare primary key, as
+    ``PrimaryKeyRelatedField`` does; subclasses that only change how input
+    is resolved still qualify.
+    """
+    return (
+        isinstance(field, PrimaryKeyRelatedField) and field.pk_field is None
+        and type(field).to_representation is PrimaryKeyRelatedField.to_representation
+    )
+
+
+class Unsupported(Exception):
+    pass
+
+
+class RowBuilder:
+    def __init__(self, serializer, queryset):
+        model = serializer.Meta.model
+        annotations = set(queryset.query.annotations)
+        self.columns = []
+        self.plan = []
+        for field in serializer._readable_fields:
+            source = field.source
+            if source == '*' or '.' in source or isinstance(field, serializers.BaseSerializer):
+                raise Unsupported(field.field_name)
+            if isinstance(field, ManyRelatedField):
+                if not is_plain_pk_field(field.child_relation):
+                    raise Unsupported(field.field_name)
+                self.plan.append((MANY, field.field_name, model._meta.get_field(source)))
+                continue
+            if source in annotations:
+                column = source
+            else:
+                try:
+                    model_field = model._meta.get_field(source)
+                except FieldDoesNotExist:
+                    raise Unsupported(field.field_name)
+                if model_field.many_to_many or model_field.one_to_many:
+                    raise Unsupported(field.field_name)
+                column = model_field.attname
+            if isinstance(field, RelatedField):
+                if not is_plain_pk_field(field):
+                    raise Unsupported(field.field_name)
+                convert = None
+            elif type(field).to_representation in IDENTITY_REPRESENTATIONS:
+                convert = None
+            else:
+                convert = field.to_representation
+            self.columns.append(column)
+            self.plan.append((SCALAR, field.field_name, (column, convert)))
+        if 'id' not in self.columns:
+            self.columns.append('id')
+
+    def related_ids(self, model_field, ids):
+        """
+        Returns ``{id: [related pk, ...]}`` for a many-to-many field, with
+        the filter and ordering ``prefetch_related`` would use.
+        """
+        related_model = model_field.related_model
+        query_name = model_field.related_query_name()
+        pairs = related_model._default_manager.filter(**{query_name + '__in': ids}).values_list(query_name, 'pk')
+        related = defaultdict(list)
+        for owner_id, pk in pairs:
+            related[owner_id].append(pk)
+        return related
+
+    def build(self, rows):
+        """
+        Converts ``values()`` dicts into the serializer's representation.
+        """
+        ids = [row['id'] for row in rows]
+        related = {
+            name: self.related_ids(model_field, ids)
+            for kind, name, model_field in self.plan if kind == MANY and ids
+        }
+        result = []
+        for row in rows:
+            item = OrderedDict()
+            for kind, name, spec in self.plan:
+                if kind == MANY:
+                    item[name] = related[name].get(row['id'], [])
+                    continue
+                column, convert = spec
+                value = row[column]
+                item[name] = value if convert is None or value is None else convert(value)
+            result.append(item)
+        return result
+
+
+class FastListMixin:
+    """
+    Serves list responses rendered as JSON from ``values()`` rows instead of
+    serializer instances. Enabled by ``ORGAPP_FAST_LIST_SERIALIZERS``.
+    """
+
+    def use_fast_list(self):
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        return getattr(settings, 'ORGAPP_FAST_LIST_SERIALIZERS', True) and isinstance(renderer, JSONRenderer)
+
+    def get_row_builder(self, queryset):
+        try:
+            return RowBuilder(self.get_serializer(), queryset)
+        except Unsupported:
+            return None
+
+    def list_response(self, queryset):
+        """
+        Returns the (paginated) list response for ``queryset``, through the
+        fast path when it applies.
+        """
+        builder = self.get_row_builder(queryset) if self.use_fast_list() else None
+        if builder is None:
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                return self.get_paginated_response(self.get_serializer(page, many=True).data)
+            return Response(self.get_serializer(queryset, many=True).data)
+
+        rows = queryset.prefetch_related(None).values(*builder.columns)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(builder.build(page))
+        return Response(builder.build(list(rows)))
+
+    def list(self, request, *args, **kwargs):
+        return self.list_response(self.filter_queryset(self.get_queryset()))
@@ -0,0 +1,173 @@
+"""
+Sparse fieldsets (``?fields=id,name``) and embedded relations
+(``?expand=roles,organization``) for read requests.
+
+Serializers using ``SparseFieldsetSerializerMixin`` accept ``fields`` and
+``expand`` arguments; the relations that can be embedded, and the serializer
+used for each, are listed in ``Meta.expandable_fields``. Viewsets using
+``SparseFieldsetMixin`` read both parameters on safe methods, pass them to
+their serializers and shape the queryset to match: ``.only()`` loads the
+columns of the requested fields, embedded foreign keys become
+``select_related`` and embedded many-to-many fields a ``Prefetch`` shaped
+the same way. Annotations in ``field_annotations`` are added only when their
+field is requested. Without either parameter nothing changes.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def split_names(value):
+    return [name for name in (part.strip() for part in value.split(',')) if name]
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Keeps only the ``fields`` given (plus the expanded ones) and replaces
+    each relation in ``expand`` with its ``Meta.expandable_fields`` entry,
+    a ``(serializer class or dotted path, keyword arguments)`` pair.
+    """
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in expand:
+            serializer_class, options = expandable[name]
+            if isinstance(serializer_class, str):
+                serializer_class = import_string(serializer_class)
+            self.fields[name] = serializer_class(read_only=True, **options)
+        if fields is not None:
+            keep = set(fields) | set(expand)
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+
+
+def get_lookups(serializer, annotations=(), prefix=''):
+    """
+    Returns ``(only, select_related, prefetch_related)`` lookups loading what
+    the readable fields of ``serializer`` need. ``only`` is ``None`` when a
+    field's columns cannot be told from its source.
+    """
+    model = serializer.Meta.model
+    only, select, prefetch = [], [], []
+    for field in serializer._readable_fields:
+        source = field.source
+        if source == '*' or '.' in source:
+            only = None
+            continue
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            if source not in annotations:
+                only = None
+            continue
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if model_field.many_to_many or model_field.one_to_many:
+            if isinstance(nested, serializers.BaseSerializer):
+                related = plan_queryset(nested, model_field.related_model._default_manager.all())
+                prefetch.append(Prefetch(prefix + source, queryset=related))
+            else:
+                prefetch.append(prefix + source)
+            continue
+        if only is not None:
+            only.append(prefix + source)
+        if isinstance(nested, serializers.BaseSerializer):
+            select.append(prefix + source)
+            nested_only, nested_select, nested_prefetch = get_lookups(nested, prefix=prefix + source + '__')
+            if only is not None and nested_only is not None:
+                only.extend(nested_only)
+            select.extend(nested_select)
+            prefetch.extend(nested_prefetch)
+    return only, select, prefetch
+
+
+def plan_queryset(serializer, queryset):
+    """
+    Replaces the related-object loading of ``queryset`` with what
+    ``serializer`` reads and defers every other column.
+    """
+    only, select, prefetch = get_lookups(serializer, set(queryset.query.annotations))
+    queryset = queryset.prefetch_related(None).prefetch_related(*prefetch)
+    if select:
+        queryset = queryset.select_related(*select)
+    if only is not None:
+        queryset = queryset.only(*only)
+    return queryset
+
+
+class SparseFieldsetMixin:
+    """
+    Applies ``?fields=`` and ``?expand=`` to the viewset's
+    ``fieldset_actions``; other actions ignore them. Should come before
+    ``ConditionalGetMixin`` and ``CachedListMixin`` so their version tables
+    include those of the embedded models.
+    """
+    field_annotations = {}
+    fieldset_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.fieldset = self.parse_fieldset(request)
+
+    def parse_fieldset(self, request):
+        """
+        Returns the requested ``(fields, expand)``; ``fields`` is ``None``
+        when every field is wanted.
+        """
+        if request.method not in SAFE_METHODS or self.action not in self.fieldset_actions:
+            return None, ()
+        expand = tuple(split_names(request.query_params.get(EXPAND_PARAM, '')))
+        expandable = getattr(self.get_serializer_class().Meta, 'expandable_fields', {})
+        unknown = [name for name in expand if name not in expandable]
+        if unknown:
+            raise serializers.ValidationError({EXPAND_PARAM: ['Cannot expand: %s.' % ', '.join(unknown)]})
+
+        fields = split_names(request.query_params.get(FIELDS_PARAM, '')) or None
+        if fields is not None:
+            readable = {name for name, field in self.get_serializer().fields.items() if not field.write_only}
+            unknown = [name for name in fields if name not in readable]
+            if unknown:
+                raise serializers.ValidationError({FIELDS_PARAM: ['Unknown fields: %s.' % ', '.join(unknown)]})
+        return fields, expand
+
+    def get_fieldset(self):
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in SAFE_METHODS:
+            return None, ()
+        return getattr(self, 'fieldset', (None, ()))
+
+    def wants_field(self, name):
+        fields, expand = self.get_fieldset()
+        return fields is None or name in fields or name in expand
+
+    def get_version_tables(self):
+        tables = list(super().get_version_tables())
+        model = self.get_serializer_class().Meta.model
+        for name in self.get_fieldset()[1]:
+            related_model = model._meta.get_field(name).related_model
+            if related_model._meta.model_name not in tables:
+                tables.append(related_model._meta.model_name)
+        return tables
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.get_fieldset()
+        if fields is not None or expand:
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        annotations = {name: value for name, value in self.field_annotations.items() if self.wants_field(name)}
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        fields, expand = self.get_fieldset()
+        if fields is None and not expand:
+            return queryset
+        return plan_queryset(self.get_serializer(), queryset)
@@ -0,0 +1,140 @@
+"""
+Query parameter filters for the list endpoints, each translated into a
+lookup an index can answer.
+
+Viewsets list their filters in ``query_filters`` (parameter name to filter)
+and add ``QueryParamFilterBackend`` to ``filter_backends``. Prefix filters
+are a range on the column, like ``subtree_bounds``, so they use the column's
+B-tree index under any collation; they are case-sensitive. ``UserSearch``
+matches every word of ``?search=`` as a prefix of a word in the username,
+email, first or last name through the ``orgapp_user_fts`` FTS5 table on
+SQLite (see migration 0007), and falls back to ``icontains`` elsewhere.
+"""
+import re
+import sys
+from functools import reduce
+from operator import and_, or_
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+USER_FTS_TABLE = 'orgapp_user_fts'
+USER_SEARCH_FIELDS = ('username', 'email', 'first_name', 'last_name')
+
+TRUE_VALUES = ('1', 'true')
+FALSE_VALUES = ('0', 'false')
+
+
+def prefix_bounds(prefix):
+    """
+    Returns ``(low, high)`` such that ``low <= s < high`` holds exactly for
+    the strings ``s`` starting with ``prefix``. Trailing U+10FFFF cannot be
+    incremented and is dropped from ``high``; ``high`` is ``None``, meaning
+    unbounded, when nothing is left.
+    """
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if not stem:
+        return prefix, None
+    return prefix, stem[:-1] + chr(ord(stem[-1]) + 1)
+
+
+def invalid(param, message):
+    return serializers.ValidationError({param: [message]})
+
+
+class ExactFilter:
+    def __init__(self, lookup, parse=str):
+        self.lookup = lookup
+        self.parse = parse
+
+    def parse_value(self, param, value):
+        try:
+            return self.parse(value)
+        except ValueError:
+            raise invalid(param, 'Invalid value.')
+
+    def filter(self, queryset, param, value):
+        return queryset.filter(**{self.lookup: self.parse_value(param, value)})
+
+
+class RelatedExactFilter(ExactFilter):
+    """
+    Keeps the rows whose primary key is among the ``column`` values of the
+    ``related`` rows matching ``lookup``. Unlike a lookup across a
+    many-to-many join, a row with several matching related rows is
+    returned once.
+    """
+
+    def __init__(self, related, column, lookup, parse=str):
+        super().__init__(lookup, parse)
+        self.related = related
+        self.column = column
+
+    def filter(self, queryset, param, value):
+        matches = self.related.filter(**{self.lookup: self.parse_value(param, value)}).values(self.column)
+        return queryset.filter(pk__in=matches)
+
+
+class BooleanFilter:
+    def __init__(self, lookup):
+        self.lookup = lookup
+
+    def filter(self, queryset, param, value):
+        value = value.lower()
+        if value not in TRUE_VALUES + FALSE_VALUES:
+            raise invalid(param, 'Must be true or false.')
+        return queryset.filter(**{self.lookup: value in TRUE_VALUES})
+
+
+class PrefixFilter:
+    def __init__(self, lookup):
+        self.lookup = lookup
+
+    def filter(self, queryset, param, value):
+        low, high = prefix_bounds(value)
+        queryset = queryset.filter(**{self.lookup + '__gte': low})
+        if high is not None:
+            queryset = queryset.filter(**{self.lookup + '__lt': high})
+        return queryset
+
+
+def match_expression(words):
+    """
+    FTS5 query requiring every word as a token prefix. Each word is quoted,
+    so FTS5 operators and column filters in the input have no effect.
+    """
+    return ' '.join('"%s"*' % word.replace('"', '""') for word in words)
+
+
+class UserSearch:
+    def filter(self, queryset, param, value):
+        words = re.findall(r'\w+', value)
+        if not words:
+            return queryset
+        if connections[queryset.db].vendor == 'sqlite':
+            matches = RawSQL(
+                'SELECT rowid FROM %s WHERE %s MATCH %%s' % (USER_FTS_TABLE, USER_FTS_TABLE),
+                [match_expression(words)],
+            )
+            return queryset.filter(id__in=matches)
+        return queryset.filter(reduce(and_, (
+            reduce(or_, (Q(**{field + '__icontains': word}) for field in USER_SEARCH_FIELDS))
+            for word in words
+        )))
+
+
+class QueryParamFilterBackend(BaseFilterBackend):
+    """
+    Applies the view's ``query_filters`` whose parameter is present and
+    non-empty.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        for param, query_filter in getattr(view, 'query_filters', {}).items():
+            value = request.query_params.get(param)
+            if value:
+                queryset = query_filter.filter(queryset, param, value)
+        return queryset
@@ -0,0 +1,110 @@
+"""
+Password hashing for bulk user creation.
+
+PBKDF2 is CPU bound and holds the GIL, so a batch of passwords hashed in the
+request thread costs one full hash per user. ``hash_passwords`` spreads a
+batch over a pool of ``ORGAPP_PASSWORD_HASH_WORKERS`` processes instead.
+Batches smaller than ``ORGAPP_PASSWORD_HASH_POOL_MIN`` are hashed in process,
+where the round trip to the pool would cost more than it saves.
+
+Workers are started by a fork server rather than forked from the web
+process, which runs other threads (requests, the audit writer) and holds
+open database connections that a forked child would inherit mid-use. Every
+web process has its own pool, so the default leaves half the CPUs, at most
+four, to each one.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import identify_hasher, make_password
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+DEFAULT_MAX_WORKERS = 4
+
+
+def get_workers():
+    workers = getattr(settings, 'ORGAPP_PASSWORD_HASH_WORKERS', None)
+    if workers:
+        return workers
+    return min(DEFAULT_MAX_WORKERS, max(1, (os.cpu_count() or 1) // 2))
+
+
+def _init_worker(settings_module):
+    # Workers start without Django.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+
+    django.setup()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=get_workers(),
+                    mp_context=multiprocessing.get_context('forkserver'),
+                    initializer=_init_worker,
+                    initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'organization_management.settings'),),
+                )
+    return _executor
+
+
+def shutdown():
+    """
+    Stops the worker processes; the next pooled batch starts a new pool.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+
+def _hash_chunk(passwords):
+    return [make_password(password) for password in passwords]
+
+
+def hash_passwords(passwords):
+    """
+    Returns the encoded hash of each password in ``passwords``, in order.
+
+    ``None`` gives an unusable password, as for ``User.set_password(None)``.
+    """
+    passwords = list(passwords)
+    workers = get_workers()
+    usable = [index for index, password in enumerate(passwords) if password is not None]
+    pool_min = getattr(settings, 'ORGAPP_PASSWORD_HASH_POOL_MIN', 8)
+    if workers <= 1 or len(usable) < max(pool_min, 2):
+        return _hash_chunk(passwords)
+
+    encoded = [make_password(None) if password is None else None for password in passwords]
+    # A few chunks per worker keeps the pool busy when hashes finish unevenly.
+    size = max(1, -(-len(usable) // (workers * 4)))
+    chunks = [usable[start:start + size] for start in range(0, len(usable), size)]
+    results = get_executor().map(_hash_chunk, [[passwords[index] for index in chunk] for chunk in chunks])
+    for chunk, hashes in zip(chunks, results):
+        for index, value in zip(chunk, hashes):
+            encoded[index] = value
+    return encoded
+
+
+def is_password_hash(value):
+    """
+    Returns whether ``value`` is an encoded password from one of the
+    configured ``PASSWORD_HASHERS``.
+    """
+    if not value:
+        return False
+    try:
+        identify_hasher(value)
+    except ValueError:
+        return False
+    return True
@@ -0,0 +1,196 @@
+"""
+Streaming user import from CSV or JSON Lines.
+
+Rows are read one at a time and written in batches with ``bulk_create``.
+Organizations and roles are resolved by name from lookup maps loaded once
+up front, so the number of queries depends on the number of batches rather
+than on the number of rows.
+"""
+import csv
+import json
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from . import bulk, hashing
+from .models import Organization, Role, User
+
+CSV = 'csv'
+JSONL = 'jsonl'
+FORMATS = (CSV, JSONL)
+
+USER_FIELDS = ('username', 'email', 'first_name', 'last_name')
+ROLE_SEPARATOR = ';'
+
+
+def iter_rows(lines, file_format):
+    """
+    Yields ``(row_number, row)`` pairs from an iterable of text lines.
+    """
+    if file_format == CSV:
+        for number, row in enumerate(csv.DictReader(lines), start=1):
+            roles = row.get('roles') or ''
+            row['roles'] = [name.strip() for name in roles.split(ROLE_SEPARATOR) if name.strip()]
+            yield number, row
+    elif file_format == JSONL:
+        number = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield number, exc
+                continue
+            if not isinstance(row, dict):
+                yield number, ValueError('Expected a JSON object.')
+                continue
+            roles = row.get('roles') or []
+            if isinstance(roles, str):
+                roles = [name.strip() for name in roles.split(ROLE_SEPARATOR) if name.strip()]
+            row['roles'] = roles
+            yield number, row
+    else:
+        raise ValueError('Unsupported format: %s' % file_format)
+
+
+def format_from_name(name):
+    return JSONL if name.lower().endswith(('.jsonl', '.ndjson')) else CSV
+
+
+class UserImporter:
+    def __init__(self, batch_size=1000, dry_run=False, max_errors=1000, on_error=None, prehashed=False, actor=None):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        # User recorded in the audit log as the creator of imported users.
+        self.actor = actor
+        # Trusted sources may supply encoded passwords (see hashing.is_password_hash)
+        # instead of plain text, which skips hashing entirely.
+        self.prehashed = prehashed
+        self.max_errors = max_errors
+        self.on_error = on_error
+        self.organizations = dict(Organization.objects.values_list('name', 'id'))
+        self.roles = {
+            (organization_id, name): role_id
+            for role_id, organization_id, name in Role.objects.values_list('id', 'organization_id', 'name')
+        }
+        self.fields = {name: User._meta.get_field(name) for name in USER_FIELDS}
+
+    def run(self, rows):
+        """
+        Imports ``(row_number, row)`` pairs as produced by ``iter_rows``.
+        """
+        self.result = {'rows': 0, 'created': 0, 'failed': 0, 'dry_run': self.dry_run, 'errors': []}
+        batch = []
+        for number, row in rows:
+            self.result['rows'] += 1
+            candidate = self.clean_row(number, row)
+            if candidate is not None:
+                batch.append(candidate)
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch)
+                batch = []
+        if batch:
+            self.write_batch(batch)
+        return self.result
+
+    def add_error(self, number, errors):
+        self.result['failed'] += 1
+        error = {'row': number, 'errors': errors}
+        if self.max_errors is None or len(self.result['errors']) < self.max_errors:
+            self.result['errors'].append(error)
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def get_text(self, row, name, errors):
+        """
+        Returns the stripped string in ``row[name]``, or ``''`` when it is
+        missing; JSON Lines rows may hold other types, which are errors.
+        """
+        value = row.get(name)
+        if value is None:
+            return ''
+        if not isinstance(value, str):
+            errors[name] = ['Expected a string.']
+            return ''
+        return value.strip()
+
+    def clean_row(self, number, row):
+        if isinstance(row, Exception):
+            self.add_error(number, {'row': [str(row)]})
+            return None
+
+        errors = {}
+        values = {}
+        for name, field in self.fields.items():
+            value = self.get_text(row, name, errors)
+            if name in errors:
+                continue
+            try:
+                values[name] = field.clean(value, None)
+            except ValidationError as exc:
+                errors[name] = exc.messages
+
+        organization_id = None
+        organization_name = self.get_text(row, 'organization', errors)
+        if organization_name:
+            organization_id = self.organizations.get(organization_name)
+            if organization_id is None:
+                errors['organization'] = ['Unknown organization "%s".' % organization_name]
+
+        role_ids = []
+        role_names = row.get('roles') or []
+        if not isinstance(role_names, list) or not all(isinstance(name, str) for name in role_names):
+            errors['roles'] = ['Expected a list of role names.']
+            role_names = []
+        for role_name in role_names:
+            role_id = self.roles.get((organization_id, role_name))
+            if role_id is None:
+                errors.setdefault('roles', []).append('Unknown role "%s" for this organization.' % role_name)
+            else:
+                role_ids.append(role_id)
+
+        password = row.get('password') or None
+        if password is not None and not isinstance(password, str):
+            errors['password'] = ['Expected a string.']
+        elif self.prehashed and password is not None and not hashing.is_password_hash(password):
+            errors['password'] = ['Expected an encoded password hash.']
+
+        if errors:
+            self.add_error(number, errors)
+            return None
+
+        values['organization_id'] = organization_id
+        return number, values, password, role_ids
+
+    def write_batch(self, batch):
+        usernames = [values['username'] for _, values, _, _ in batch]
+        emails = [values['email'] for _, values, _, _ in batch]
+        taken_usernames = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        taken_emails = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+
+        users = []
+        passwords = []
+        user_role_ids = []
+        for number, values, password, role_ids in batch:
+            errors = {}
+            if values['username'] in taken_usernames:
+                errors['username'] = ['A user with that username already exists.']
+            if values['email'] in taken_emails:
+                errors['email'] = ['A user with that email already exists.']
+            if errors:
+                self.add_error(number, errors)
+                continue
+            taken_usernames.add(values['username'])
+            taken_emails.add(values['email'])
+            users.append(User(**values))
+            passwords.append(password)
+            user_role_ids.append(role_ids)
+
+        if not self.dry_run and users:
+            if not self.prehashed:
+                passwords = hashing.hash_passwords(passwords)
+            for user, password in zip(users, passwords):
+                user.password = password if password is not None else make_password(None)
+            bulk.insert_users(users, user_role_ids, actor=self.actor, batch_size=self.batch_size)
+        self.result['created'] += len(users)
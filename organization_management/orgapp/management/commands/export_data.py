@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orgapp.exporters import FORMATS, NDJSON, RESOURCES, iter_export
+
+
+class Command(BaseCommand):
+    help = 'Streams organizations, roles or users as NDJSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=sorted(RESOURCES))
+        parser.add_argument('--format', choices=FORMATS, default=NDJSON)
+        parser.add_argument('--output', help='Write to this file instead of stdout.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+        chunks = iter_export(options['resource'], options['format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
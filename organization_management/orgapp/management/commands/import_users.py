@@ -0,0 +1,45 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orgapp.importers import FORMATS, UserImporter, format_from_name, iter_rows
+
+
+class Command(BaseCommand):
+    help = 'Imports users from a CSV or JSON Lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Validate rows without writing them.')
+        parser.add_argument(
+            '--prehashed', action='store_true',
+            help='The password column holds encoded hashes from a trusted source; store them as is.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        file_format = options['format'] or format_from_name(options['path'])
+
+        def report(error):
+            self.stderr.write('row %(row)s: %(errors)s' % {'row': error['row'], 'errors': json.dumps(error['errors'])})
+
+        importer = UserImporter(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            max_errors=0,
+            on_error=report,
+            prehashed=options['prehashed'],
+        )
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+                result = importer.run(iter_rows(lines, file_format))
+        except OSError as exc:
+            raise CommandError(exc)
+
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write('%s %d users from %d rows (%d failed).' % (
+            verb, result['created'], result['rows'], result['failed'],
+        ))
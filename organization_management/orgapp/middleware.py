@@ -0,0 +1,116 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import routers
+
+logger = logging.getLogger('orgapp.queries')
+
+DEFAULTS = {
+    'ENABLED': False,
+    'PATH_PREFIXES': ('/api/',),
+    'DUPLICATE_THRESHOLD': 5,
+    'SLOWEST': 3,
+}
+
+
+class QueryProfile:
+    """
+    ``execute_wrapper`` hook that times every statement run on a connection.
+    """
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started, context['connection'].alias))
+
+    def report(self, duplicate_threshold, slowest):
+        counts = Counter(sql for sql, _, _ in self.queries)
+        duplicates = [
+            {'sql': sql, 'count': count}
+            for sql, count in counts.most_common()
+            if count >= duplicate_threshold
+        ]
+        ranked = sorted(self.queries, key=lambda query: query[1], reverse=True)[:slowest]
+        return {
+            'query_count': len(self.queries),
+            'db_time_ms': round(sum(duration for _, duration, _ in self.queries) * 1000, 3),
+            'duplicates': duplicates,
+            'slowest': [
+                {'sql': sql, 'time_ms': round(duration * 1000, 3), 'database': alias}
+                for sql, duration, alias in ranked
+            ],
+        }
+
+
+class QueryProfilingMiddleware:
+    """
+    Reports query count, DB time, the slowest statements and repeated
+    statements (the N+1 signature) for API requests.
+
+    Enabled with ``ORGAPP_QUERY_PROFILING['ENABLED']``; when disabled Django
+    drops the middleware from the chain at startup. Queries run while a
+    streaming response is iterated are not included.
+    """
+    def __init__(self, get_response):
+        config = dict(DEFAULTS, **getattr(settings, 'ORGAPP_QUERY_PROFILING', {}))
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.path_prefixes = tuple(config['PATH_PREFIXES'])
+        self.duplicate_threshold = config['DUPLICATE_THRESHOLD']
+        self.slowest = config['SLOWEST']
+
+    def __call__(self, request):
+        if not request.path.startswith(self.path_prefixes):
+            return self.get_response(request)
+
+        profile = QueryProfile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            response = self.get_response(request)
+
+        report = profile.report(self.duplicate_threshold, self.slowest)
+        timing = 'db;dur=%.3f;desc="%d queries"' % (report['db_time_ms'], report['query_count'])
+        if report['duplicates']:
+            timing += ', db-duplicates;desc="%d repeated statements"' % len(report['duplicates'])
+        response['Server-Timing'] = timing
+
+        report.update(method=request.method, path=request.path, status=response.status_code)
+        level = logging.WARNING if report['duplicates'] else logging.INFO
+        logger.log(level, json.dumps(report))
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """
+    Pins users to the primary database for a short window after a request
+    of theirs changed data, so that reads routed by ``orgapp.routers`` see
+    their own writes. Dropped from the chain when no replica is configured.
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        if not routers.get_replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in self.safe_methods and response.status_code < 400:
+            # DRF copies the user it authenticated onto the Django request.
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                routers.pin_to_primary(user.pk)
+        return response
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orgapp', '0002_alter_user_organization'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='role',
+            index=models.Index(fields=['name'], name='orgapp_role_name_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='role',
+            constraint=models.UniqueConstraint(fields=('organization', 'name'), name='orgapp_role_unique_org_name'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:39
+
+from django.db import migrations, models
+from django.db.models import Value
+from django.db.models.functions import Cast, Concat
+import django.db.models.deletion
+
+
+def set_root_paths(apps, schema_editor):
+    # Existing organizations have no parent, so each one is its own root.
+    Organization = apps.get_model('orgapp', 'Organization')
+    Organization.objects.update(path=Concat(Value('/'), Cast('id', models.CharField()), Value('/')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orgapp', '0003_role_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='children', to='orgapp.organization'),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(set_root_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('orgapp', '0004_organization_hierarchy'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='user',
+            options={'permissions': [('assign_roles', 'Can assign roles to users')], 'verbose_name': 'user', 'verbose_name_plural': 'users'},
+        ),
+        migrations.AddField(
+            model_name='role',
+            name='permissions',
+            field=models.ManyToManyField(blank=True, related_name='roles', to='auth.Permission'),
+        ),
+    ]
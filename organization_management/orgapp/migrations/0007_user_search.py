@@ -0,0 +1,68 @@
+from django.db import migrations, models
+
+# External-content FTS5 index over the user name fields, kept current by
+# triggers; see orgapp.filters.UserSearch. SQLite only. Short prefixes
+# expand to the most words, so prefixes of up to 5 characters are indexed.
+CREATE_STATEMENTS = [
+    """
+    CREATE VIRTUAL TABLE orgapp_user_fts USING fts5(
+        username, email, first_name, last_name,
+        content='orgapp_user', content_rowid='id', prefix='2 3 4 5'
+    )
+    """,
+    """
+    CREATE TRIGGER orgapp_user_fts_insert AFTER INSERT ON orgapp_user BEGIN
+        INSERT INTO orgapp_user_fts (rowid, username, email, first_name, last_name)
+        VALUES (new.id, new.username, new.email, new.first_name, new.last_name);
+    END
+    """,
+    """
+    CREATE TRIGGER orgapp_user_fts_delete AFTER DELETE ON orgapp_user BEGIN
+        INSERT INTO orgapp_user_fts (orgapp_user_fts, rowid, username, email, first_name, last_name)
+        VALUES ('delete', old.id, old.username, old.email, old.first_name, old.last_name);
+    END
+    """,
+    """
+    CREATE TRIGGER orgapp_user_fts_update AFTER UPDATE OF username, email, first_name, last_name ON orgapp_user BEGIN
+        INSERT INTO orgapp_user_fts (orgapp_user_fts, rowid, username, email, first_name, last_name)
+        VALUES ('delete', old.id, old.username, old.email, old.first_name, old.last_name);
+        INSERT INTO orgapp_user_fts (rowid, username, email, first_name, last_name)
+        VALUES (new.id, new.username, new.email, new.first_name, new.last_name);
+    END
+    """,
+    "INSERT INTO orgapp_user_fts (orgapp_user_fts) VALUES ('rebuild')",
+]
+
+DROP_STATEMENTS = [
+    'DROP TRIGGER IF EXISTS orgapp_user_fts_update',
+    'DROP TRIGGER IF EXISTS orgapp_user_fts_delete',
+    'DROP TRIGGER IF EXISTS orgapp_user_fts_insert',
+    'DROP TABLE IF EXISTS orgapp_user_fts',
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orgapp', '0006_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_active', False)), fields=['id'], name='orgapp_user_inactive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_staff', True)), fields=['id'], name='orgapp_user_staff_idx'),
+        ),
+        migrations.RunPython(run_on_sqlite(CREATE_STATEMENTS), run_on_sqlite(DROP_STATEMENTS)),
+    ]
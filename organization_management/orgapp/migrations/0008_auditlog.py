@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:30
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orgapp', '0007_user_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.PositiveIntegerField(editable=False)),
+                ('created_at', models.DateTimeField(editable=False)),
+                ('actor_id', models.BigIntegerField(blank=True, null=True)),
+                ('actor_username', models.CharField(blank=True, max_length=150)),
+                ('action', models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete')], max_length=10)),
+                ('resource', models.CharField(max_length=32)),
+                ('object_id', models.BigIntegerField()),
+                ('changes', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['month', 'id'], name='orgapp_audit_month_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['resource', 'object_id'], name='orgapp_audit_object_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['actor_id'], name='orgapp_audit_actor_idx'),
+        ),
+    ]
@@ -18,31 +18,195 @@ class User(AbstractUser):
     roles = models.ManyToManyField(Role)
 
 '''
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
+
+PATH_SEPARATOR = '/'
+
+
+def subtree_bounds(path):
+    """
+    Returns ``(low, high)`` such that ``low <= p < high`` holds exactly for
+    the paths in the subtree rooted at ``path``, the node included.
+
+    A range on an indexed column works with any database, unlike a LIKE
+    prefix which SQLite only optimizes under case-sensitive settings.
+    """
+    return path, path[:-1] + chr(ord(PATH_SEPARATOR) + 1)
+
 
 class Organization(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Deleting an organization that still has children is refused.
+    parent = models.ForeignKey('self', related_name='children', on_delete=models.PROTECT, null=True, blank=True)
+    # Materialized path of ancestor ids, e.g. "/1/4/9/" for 9 under 4 under 1.
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_parent_id = instance.__dict__.get('parent_id')
+        return instance
+
+    def build_path(self, parent_path=None):
+        if self.parent_id is None:
+            return '%s%s%s' % (PATH_SEPARATOR, self.pk, PATH_SEPARATOR)
+        if parent_path is None:
+            parent_path = Organization.objects.filter(pk=self.parent_id).values_list('path', flat=True).get()
+        return '%s%s%s' % (parent_path, self.pk, PATH_SEPARATOR)
+
+    def is_ancestor_of(self, other):
+        return bool(self.path) and other.path.startswith(self.path)
+
+    def save(self, *args, **kwargs):
+        creating = self.pk is None
+        moved = not creating and self.parent_id != getattr(self, '_loaded_parent_id', self.parent_id)
+        if moved and self.parent_id is not None:
+            parent_path = Organization.objects.filter(pk=self.parent_id).values_list('path', flat=True).get()
+            if self.path and parent_path.startswith(self.path):
+                raise ValueError('An organization cannot be moved under its own subtree.')
+        super().save(*args, **kwargs)
+        if creating:
+            self.path = self.build_path()
+            Organization.objects.filter(pk=self.pk).update(path=self.path)
+        elif moved:
+            self.move_subtree(self.build_path())
+        self._loaded_parent_id = self.parent_id
+
+    def move_subtree(self, new_path):
+        """
+        Rewrites the path of this organization and all its descendants with
+        a single UPDATE.
+        """
+        old_path = self.path
+        low, high = subtree_bounds(old_path)
+        Organization.objects.filter(path__gte=low, path__lt=high).update(
+            path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+        )
+        self.path = new_path
+
+    def get_descendants(self, include_self=False):
+        low, high = subtree_bounds(self.path)
+        queryset = Organization.objects.filter(path__gte=low, path__lt=high)
+        if not include_self:
+            queryset = queryset.exclude(pk=self.pk)
+        return queryset
+
+    def get_ancestors(self):
+        ids = [int(pk) for pk in self.path.strip(PATH_SEPARATOR).split(PATH_SEPARATOR)[:-1]]
+        return Organization.objects.filter(pk__in=ids)
+
 class Role(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
     organization = models.ForeignKey(Organization, related_name='roles', on_delete=models.CASCADE)
+    permissions = models.ManyToManyField('auth.Permission', related_name='roles', blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name'], name='orgapp_role_name_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'name'], name='orgapp_role_unique_org_name'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Role names are copied into access tokens; see orgapp.signals.
+        instance._loaded_name = instance.__dict__.get('name')
+        return instance
+
 class User(AbstractUser):
     email = models.EmailField(unique=True)
     organization = models.ForeignKey(Organization, on_delete=models.SET_NULL, null=True, blank=True)
     roles = models.ManyToManyField(Role)
+    # Bumped whenever the claims carried by the user's access tokens go
+    # stale; tokens issued for an older version are rejected.
+    token_version = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta(AbstractUser.Meta):
+        swappable = 'AUTH_USER_MODEL'
+        permissions = [
+            ('assign_roles', 'Can assign roles to users'),
+        ]
+        # Partial indexes in id order for the rare side of the flag filters,
+        # which would otherwise scan the table for a page of matches.
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(is_active=False), name='orgapp_user_inactive_idx'),
+            models.Index(fields=['id'], condition=models.Q(is_staff=True), name='orgapp_user_staff_idx'),
+        ]
 
     def __str__(self):
         return self.username
 
 
+def month_key(moment):
+    """
+    Partition key of ``moment``: its year and month as ``YYYYMM``.
+    """
+    return moment.year * 100 + moment.month
+
+
+class AppendOnlyQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        raise ValueError('Audit log entries cannot be changed.')
+
+    def delete(self):
+        raise ValueError('Audit log entries cannot be deleted.')
+
+
+class AuditLog(models.Model):
+    """
+    One change to an organization, role or user. Rows are only ever
+    inserted; ``month`` is the partition key and leads the main index, so a
+    month's entries are one index range.
+    """
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTIONS = [(CREATE, 'Create'), (UPDATE, 'Update'), (DELETE, 'Delete')]
+
+    month = models.PositiveIntegerField(editable=False)
+    created_at = models.DateTimeField(editable=False)
+    # Plain values rather than a foreign key, so entries outlive the actor.
+    actor_id = models.BigIntegerField(null=True, blank=True)
+    actor_username = models.CharField(max_length=150, blank=True)
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    resource = models.CharField(max_length=32)
+    object_id = models.BigIntegerField()
+    # Scalar fields as [before, after]; many-to-many fields as
+    # {"added": [...], "removed": [...]}.
+    changes = models.JSONField(encoder=DjangoJSONEncoder, default=dict)
+
+    objects = AppendOnlyQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['month', 'id'], name='orgapp_audit_month_idx'),
+            models.Index(fields=['resource', 'object_id'], name='orgapp_audit_object_idx'),
+            models.Index(fields=['actor_id'], name='orgapp_audit_actor_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Audit log entries cannot be changed.')
+        if self.created_at is None:
+            self.created_at = timezone.now()
+        self.month = month_key(self.created_at)
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('Audit log entries cannot be deleted.')
@@ -0,0 +1,24 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the primary key.
+
+    Each page is fetched with ``WHERE id > <cursor> ORDER BY id LIMIT n`` so
+    deep pages cost the same as the first one.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        return getattr(settings, 'ORGAPP_MAX_PAGE_SIZE', 1000)
+
+
+class AuditLogPagination(IdCursorPagination):
+    """
+    Newest entries first, walking back along the primary key.
+    """
+    ordering = '-id'
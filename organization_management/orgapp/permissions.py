@@ -1,5 +1,46 @@
 from rest_framework.permissions import BasePermission
 
+from . import role_cache
+from .authentication import ClaimsUser
+
+
+def get_access(request):
+    """
+    Returns the requesting user's compiled roles and role permissions.
+
+    JWT-authenticated requests carry it in their token claims. Otherwise it
+    comes from the process-wide role cache (one query on a miss) the first
+    time a permission check asks for it and is reused for the rest of the
+    request.
+    """
+    access = getattr(request, '_access', None)
+    if access is None:
+        user = request.user
+        if isinstance(user, ClaimsUser):
+            access = role_cache.UserAccess(user.role_names, user.permissions)
+        elif user and user.is_authenticated:
+            access = role_cache.get_access(user)
+        else:
+            access = role_cache.UserAccess(frozenset(), frozenset())
+        request._access = access
+    return access
+
+
+def get_role_names(request):
+    return get_access(request).role_names
+
+
+def has_role_permission(request, permission):
+    """
+    Returns whether the user's roles grant ``permission``
+    ("app_label.codename"). Superusers hold every permission.
+    """
+    user = request.user
+    if user and user.is_superuser:
+        return True
+    return permission in get_access(request).permissions
+
+
 class IsSuperAdmin(BasePermission):
     """
     Allows access only to superadmin users.
@@ -13,8 +54,12 @@ class IsAdmin(BasePermission):
 
 class IsManager(BasePermission):
     def has_permission(self, request, view):
-        return request.user.roles.filter(name='Manager').exists()
+        return 'Manager' in get_role_names(request)
 
 class IsMember(BasePermission):
     def has_permission(self, request, view):
-        return request.user.roles.filter(name='Member').exists()
+        return 'Member' in get_role_names(request)
+
+class CanAssignRoles(BasePermission):
+    def has_permission(self, request, view):
+        return has_role_permission(request, 'orgapp.assign_roles')
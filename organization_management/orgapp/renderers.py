@@ -0,0 +1,43 @@
+"""
+JSON renderer producing the same bytes as DRF's ``JSONRenderer``, using
+orjson when it is installed.
+
+orjson already writes compact, unescaped UTF-8, which is what DRF emits with
+its default ``COMPACT_JSON`` and ``UNICODE_JSON`` settings. Dates, times and
+any type orjson does not know are handed back to DRF's encoder, and
+U+2028/U+2029 are escaped afterwards as DRF does. Whenever the output could
+differ (indentation requested, non-default settings, values orjson rejects)
+rendering falls back to ``JSONRenderer``. Floats are written by orjson's own
+shortest-representation algorithm, which can differ from ``repr`` in the
+exponent form, and NaN/infinity become null; none of the orgapp resources
+have float fields.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    def __init__(self):
+        self.encoder = self.encoder_class()
+
+    def can_use_orjson(self, accepted_media_type, renderer_context):
+        return (
+            orjson is not None
+            and self.compact
+            and not self.ensure_ascii
+            and self.get_indent(accepted_media_type, renderer_context or {}) is None
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or not self.can_use_orjson(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except (orjson.JSONEncodeError, TypeError):
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
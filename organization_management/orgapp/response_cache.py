@@ -0,0 +1,92 @@
+"""
+Server-side cache of serialized list responses.
+
+Keys embed the version tokens from ``orgapp.versioning``, so a save or delete
+on any table a response depends on makes its old entries unreachable at
+once; the timeout only bounds how long unreachable entries linger.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from . import routers, versioning
+
+KEY_PREFIX = 'orgapp:response:'
+
+# Seconds a recompute may hold the lock, and how often waiters poll.
+LOCK_TIMEOUT = 10
+POLL_INTERVAL = 0.05
+
+
+def get_cache():
+    return caches[getattr(settings, 'ORGAPP_RESPONSE_CACHE', 'default')]
+
+
+def get_or_compute(key, compute, timeout=None, wait=None):
+    """
+    Returns the cached value for ``key``, computing and storing it on a miss.
+
+    Only the caller that wins the lock for ``key`` runs ``compute``; the
+    others poll for its result for up to ``wait`` seconds before computing
+    it themselves.
+    """
+    cache = get_cache()
+    if timeout is None:
+        timeout = getattr(settings, 'ORGAPP_RESPONSE_CACHE_TIMEOUT', 300)
+    if wait is None:
+        wait = getattr(settings, 'ORGAPP_RESPONSE_CACHE_WAIT', 5)
+
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = key + ':lock'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return compute()
+
+
+class CachedListMixin:
+    """
+    Serves ``list`` from the response cache. Callers for whom
+    ``get_cache_scope`` returns the same value share cached responses.
+
+    Misses are computed on the primary: a replica may not have caught up
+    with the write that bumped the version tokens in the key yet.
+    """
+    version_tables = ()
+
+    def get_version_tables(self):
+        return self.version_tables
+
+    def get_cache_scope(self):
+        return ''
+
+    def get_list_cache_key(self, request):
+        # Pagination links are absolute, so the scheme and host are part of
+        # the response.
+        parts = [self.basename, self.get_cache_scope(), request.build_absolute_uri()]
+        parts.extend(token for token, _ in (versioning.get_version(table) for table in self.get_version_tables()))
+        return KEY_PREFIX + hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    def list(self, request, *args, **kwargs):
+        def compute():
+            with routers.read_from(routers.PRIMARY):
+                return super(CachedListMixin, self).list(request, *args, **kwargs).data
+
+        return Response(get_or_compute(self.get_list_cache_key(request), compute))
@@ -0,0 +1,113 @@
+"""
+Process-wide cache of each user's compiled access: the names of the roles
+they hold and the permissions those roles grant.
+
+Entries live in the cache named by ``ORGAPP_ROLE_CACHE`` and are evicted by
+the signal handlers in ``orgapp.signals`` whenever a user's roles or the
+permissions of one of those roles change.
+"""
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+KEY_PREFIX = 'orgapp:roles:'
+
+
+class RoleCacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def record(self, hits=0, misses=0, evictions=0):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.evictions += evictions
+
+    def as_dict(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+stats = RoleCacheStats()
+
+# Permissions are "app_label.codename" strings, as for User.has_perm().
+UserAccess = namedtuple('UserAccess', ['role_names', 'permissions'])
+
+
+def get_cache():
+    return caches[getattr(settings, 'ORGAPP_ROLE_CACHE', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'ORGAPP_ROLE_CACHE_TIMEOUT', 300)
+
+
+def _key(user_id):
+    return '%s%s' % (KEY_PREFIX, user_id)
+
+
+def compile_access(user):
+    """
+    Loads the role names and role permissions of ``user`` with one query.
+    """
+    from .models import Role
+
+    role_names = set()
+    permissions = set()
+    rows = Role.objects.filter(user=user).values_list(
+        'name', 'permissions__content_type__app_label', 'permissions__codename',
+    )
+    for name, app_label, codename in rows:
+        role_names.add(name)
+        if codename is not None:
+            permissions.add('%s.%s' % (app_label, codename))
+    return UserAccess(frozenset(role_names), frozenset(permissions))
+
+
+def get_access(user):
+    """
+    Returns the ``UserAccess`` of ``user``, compiling it on a cache miss.
+    """
+    cache = get_cache()
+    key = _key(user.pk)
+    cached = cache.get(key)
+    if cached is not None:
+        stats.record(hits=1)
+        return UserAccess(frozenset(cached[0]), frozenset(cached[1]))
+
+    stats.record(misses=1)
+    access = compile_access(user)
+    cache.set(key, (tuple(access.role_names), tuple(access.permissions)), get_timeout())
+    return access
+
+
+def get_role_names(user):
+    """
+    Returns a frozenset with the names of the roles held by ``user``.
+    """
+    return get_access(user).role_names
+
+
+def evict(*user_ids):
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    if not user_ids:
+        return
+    get_cache().delete_many([_key(user_id) for user_id in user_ids])
+    stats.record(evictions=len(user_ids))
+
+
+def clear():
+    """
+    Drops every cached entry. Only meant for a dedicated cache alias.
+    """
+    get_cache().clear()
+    stats.reset()
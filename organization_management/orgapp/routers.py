@@ -0,0 +1,108 @@
+"""
+Read-replica routing for the orgapp viewsets.
+
+Viewsets using ``ReplicaReadMixin`` send the queries of their read actions
+(``list``, ``retrieve`` and the read-only extra actions) to one of the
+aliases in ``ORGAPP_DATABASE_REPLICAS``; everything else, including
+authentication and permission checks, stays on the primary (``default``).
+The choice is held in a context variable, so it applies only to the current
+request.
+
+Replicas lag behind the primary. After a user's request writes something,
+``ReplicaPinningMiddleware`` pins that user to the primary for
+``ORGAPP_REPLICA_STICKY_SECONDS`` so they read their own writes. Pins are
+stored in the ``ORGAPP_REPLICA_CACHE`` cache; with several worker processes
+it has to be a shared one (Redis, Memcached), since a local-memory cache
+only pins the user in the worker that handled the write.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+PRIMARY = 'default'
+KEY_PREFIX = 'orgapp:primary:'
+
+_read_alias = ContextVar('orgapp_read_alias', default=None)
+
+
+def get_replicas():
+    return list(getattr(settings, 'ORGAPP_DATABASE_REPLICAS', []))
+
+
+def get_cache():
+    return caches[getattr(settings, 'ORGAPP_REPLICA_CACHE', 'default')]
+
+
+def pin_to_primary(user_id):
+    timeout = getattr(settings, 'ORGAPP_REPLICA_STICKY_SECONDS', 5)
+    if timeout:
+        get_cache().set(KEY_PREFIX + str(user_id), True, timeout)
+
+
+def is_pinned(user_id):
+    return bool(get_cache().get(KEY_PREFIX + str(user_id)))
+
+
+def choose_replica(user):
+    """
+    Returns the replica alias for a read by ``user``, or ``None`` when no
+    replica is configured or the user recently wrote to the primary.
+    """
+    replicas = get_replicas()
+    if not replicas:
+        return None
+    if user is not None and user.is_authenticated and is_pinned(user.pk):
+        return None
+    return random.choice(replicas)
+
+
+def current_read_alias():
+    return _read_alias.get()
+
+
+@contextmanager
+def read_from(alias):
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {PRIMARY, *get_replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Serves ``replica_actions`` from a replica once authentication and
+    permission checks have run on the primary.
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.replica_actions:
+            alias = choose_replica(request.user)
+            if alias is not None:
+                self._read_alias_token = _read_alias.set(alias)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_read_alias_token', None)
+        if token is not None:
+            self._read_alias_token = None
+            _read_alias.reset(token)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,98 @@
+from rest_framework import serializers
+
+from .models import Organization, subtree_bounds
+
+
+class OrganizationScopedMixin:
+    """
+    Restricts a viewset's queryset to the requesting user's organization.
+
+    Staff and superusers see every row. ``?organization=<id>`` narrows the
+    result to one organization, and ``?include_descendants=true`` widens
+    both filters to the organization's whole subtree. Filters are equality
+    on ``scope_field`` (an indexed foreign key or primary key) or a range on
+    the indexed ``path_field``, so they are resolved by the database.
+
+    Writes by other users must leave the object, placed through the
+    serializer's ``write_scope_field``, inside the scope they read through:
+    their own organization, or its subtree with ``include_descendants``.
+    Should come before ``ConditionalGetMixin`` and ``CachedListMixin`` so
+    subtree reads also depend on the organization table.
+    """
+    scope_field = 'organization_id'
+    path_field = 'organization__path'
+    write_scope_field = 'organization'
+    # Whether objects are scoped one level below ``write_scope_field``, like
+    # organizations written under their parent.
+    write_scope_nested = False
+
+    def sees_all_organizations(self):
+        user = self.request.user
+        return user.is_staff or user.is_superuser
+
+    def include_descendants(self):
+        return self.request.query_params.get('include_descendants') in ('1', 'true')
+
+    def filter_organization(self, queryset, organization_id):
+        if not self.include_descendants():
+            return queryset.filter(**{self.scope_field: organization_id})
+        path = Organization.objects.filter(pk=organization_id).values_list('path', flat=True).first()
+        if path is None:
+            return queryset.none()
+        low, high = subtree_bounds(path)
+        return queryset.filter(**{self.path_field + '__gte': low, self.path_field + '__lt': high})
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.sees_all_organizations():
+            organization_id = self.request.user.organization_id
+            if organization_id is None:
+                return queryset.none()
+            queryset = self.filter_organization(queryset, organization_id)
+        organization_id = self.request.query_params.get('organization')
+        if organization_id:
+            if not organization_id.isdigit():
+                return queryset.none()
+            queryset = self.filter_organization(queryset, int(organization_id))
+        return queryset
+
+    def get_version_tables(self):
+        tables = list(super().get_version_tables())
+        # Subtree filters read Organization.path, which moves change.
+        if self.include_descendants() and 'organization' not in tables:
+            tables.append('organization')
+        return tables
+
+    def check_write_scope(self, serializer):
+        field = self.write_scope_field
+        if self.sees_all_organizations():
+            return
+        instance = serializer.instance
+        if instance is not None and (field not in serializer.validated_data
+                                     or serializer.validated_data[field] == getattr(instance, field)):
+            return
+        organization = serializer.validated_data.get(field)
+        if not self.include_descendants():
+            if self.write_scope_nested:
+                message = 'Writing below your organization requires include_descendants=true.'
+            elif organization is None or organization.pk != self.request.user.organization_id:
+                message = 'Must be your organization, or one of its descendants with include_descendants=true.'
+            else:
+                return
+            raise serializers.ValidationError({field: [message]})
+        path = Organization.objects.filter(pk=self.request.user.organization_id).values_list('path', flat=True).first()
+        if organization is None or path is None or not organization.path.startswith(path):
+            raise serializers.ValidationError({field: ['Must be your organization or one of its descendants.']})
+
+    def perform_create(self, serializer):
+        self.check_write_scope(serializer)
+        super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        self.check_write_scope(serializer)
+        super().perform_update(serializer)
+
+    def get_cache_scope(self):
+        if self.sees_all_organizations():
+            return 'all'
+        return 'organization:%s' % self.request.user.organization_id
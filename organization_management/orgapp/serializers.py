@@ -1,19 +1,215 @@
+from django.contrib.auth.hashers import make_password
 from rest_framework import serializers
-from .models import Organization, Role, User
+from rest_framework.validators import UniqueValidator
+from . import bulk
+from .authentication import revoke_tokens
+from .fieldsets import SparseFieldsetSerializerMixin
+from .models import AuditLog, Organization, Role, User
+
+# Embedded organizations leave out the counts, which need annotations.
+EMBEDDED_ORGANIZATION = (
+    'orgapp.serializers.OrganizationSerializer',
+    {'fields': ('id', 'name', 'description', 'created_at', 'parent', 'path')},
+)
+
+class OrganizationSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    user_count = serializers.IntegerField(read_only=True)
+    role_count = serializers.IntegerField(read_only=True)
 
-class OrganizationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Organization
         fields = '__all__'
+        expandable_fields = {'parent': EMBEDDED_ORGANIZATION}
 
-class RoleSerializer(serializers.ModelSerializer):
+    def validate_parent(self, value):
+        if value is not None and self.instance is not None:
+            if value.pk == self.instance.pk or self.instance.is_ancestor_of(value):
+                raise serializers.ValidationError('An organization cannot be moved under its own subtree.')
+        return value
+
+class RoleSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Role
         fields = '__all__'
+        expandable_fields = {'organization': EMBEDDED_ORGANIZATION}
+
+    def validate_permissions(self, value):
+        request = self.context.get('request')
+        if request is not None and not request.user.is_staff:
+            raise serializers.ValidationError('Only admins can change role permissions.')
+        return value
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolves ids from ``preloaded`` (primary key to instance) once a list
+    serializer has loaded every row's ids in one query; queries per id
+    otherwise.
+    """
+    preloaded = None
+
+    def preload(self, values):
+        ids = set()
+        for value in values:
+            try:
+                ids.add(self.parse_pk(value))
+            except (TypeError, ValueError):
+                pass
+        self.preloaded = self.get_queryset().in_bulk(ids)
+
+    def parse_pk(self, value):
+        if isinstance(value, bool):
+            raise TypeError
+        return int(value)
+
+    def to_internal_value(self, data):
+        if self.preloaded is None:
+            return super().to_internal_value(data)
+        try:
+            instance = self.preloaded.get(self.parse_pk(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
+
+
+class BulkUserSerializer(serializers.ListSerializer):
+    """
+    Creates a list of users with one ``bulk_create`` and one batch of
+    password hashes; see ``bulk.create_users``.
+
+    Validation takes a fixed number of queries: related ids are loaded for
+    all rows at once and uniqueness is checked for all rows at once, as in
+    ``UserImporter.write_batch``.
+    """
+    unique_fields = ('username', 'email')
+
+    def preload(self, data):
+        rows = [row for row in data if isinstance(row, dict)] if isinstance(data, list) else []
+        fields = self.child.fields
+        fields['organization'].preload(row.get('organization') for row in rows if row.get('organization') is not None)
+        role_ids = (
+            role_id for row in rows if isinstance(row.get('roles'), list) for role_id in row['roles']
+        )
+        fields['roles'].child_relation.preload(role_ids)
+        # Replaced by one query per field in check_unique().
+        self.unique_messages = {}
+        for name in self.unique_fields:
+            validators = fields[name].validators
+            for validator in validators:
+                if isinstance(validator, UniqueValidator):
+                    self.unique_messages[name] = validator.message
+            fields[name].validators = [validator for validator in validators if not isinstance(validator, UniqueValidator)]
+
+    def check_unique(self, attrs):
+        errors = [{} for _ in attrs]
+        for name in self.unique_fields:
+            values = [row.get(name) for row in attrs]
+            taken = set(User.objects.filter(**{name + '__in': values}).values_list(name, flat=True))
+            seen = set()
+            for index, value in enumerate(values):
+                if value in seen:
+                    errors[index][name] = ['Duplicate %s in this request.' % name]
+                elif value in taken:
+                    errors[index][name] = [self.unique_messages.get(name, 'This field must be unique.')]
+                seen.add(value)
+        return errors
+
+    def to_internal_value(self, data):
+        self.preload(data)
+        attrs = super().to_internal_value(data)
+        # Checked here rather than in validate() so the errors keep the
+        # per-item list shape of field errors.
+        errors = self.check_unique(attrs)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data):
+        request = self.context.get('request')
+        return bulk.create_users(validated_data, actor=request.user if request is not None else None)
+
+
+class UserSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
 
-class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = '__all__'
+        list_serializer_class = BulkUserSerializer
+        fields = (
+            'id', 'username', 'email', 'password', 'first_name', 'last_name',
+            'is_active', 'is_staff', 'date_joined', 'organization', 'roles',
+        )
+        read_only_fields = ('date_joined',)
+        extra_kwargs = {'password': {'write_only': True}}
+        expandable_fields = {
+            'organization': EMBEDDED_ORGANIZATION,
+            'roles': (RoleSerializer, {'many': True}),
+        }
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        # Hashed during validation, before SerializedWriteMixin takes the
+        # write lock. Bulk rows are hashed together by bulk.create_users.
+        if 'password' in attrs and not isinstance(self.parent, serializers.ListSerializer):
+            attrs['password'] = make_password(attrs['password'])
+        return attrs
+
+    def create(self, validated_data):
+        password = validated_data.pop('password', None)
+        roles = validated_data.pop('roles', [])
+        user = User(**validated_data)
+        user.password = password or make_password(None)
+        user.save()
+        user.roles.set(roles)
+        return user
+
+    # Fields copied into access tokens, or that should end existing sessions.
+    token_fields = ('username', 'is_active', 'is_staff', 'organization')
+
+    def update(self, instance, validated_data):
+        password = validated_data.pop('password', None)
+        if password is not None:
+            instance.password = password
+        stale = password is not None or any(
+            field in validated_data and validated_data[field] != getattr(instance, field)
+            for field in self.token_fields
+        )
+        instance = super().update(instance, validated_data)
+        if stale:
+            revoke_tokens(instance.pk)
+        return instance
 
 
+class BulkRoleAssignmentSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    role_ids = serializers.ListField(child=serializers.IntegerField())
+    mode = serializers.ChoiceField(choices=bulk.MODES, default=bulk.ADD)
+
+    def _check_exists(self, model, ids):
+        ids = set(ids)
+        found = set(model.objects.filter(id__in=ids).values_list('id', flat=True))
+        missing = sorted(ids - found)
+        if missing:
+            raise serializers.ValidationError('Unknown ids: %s' % ', '.join(str(pk) for pk in missing))
+        return ids
+
+    def validate_user_ids(self, value):
+        self._check_exists(User, value)
+        return value
+
+    def validate_role_ids(self, value):
+        self._check_exists(Role, value)
+        return value
+
+    def validate(self, attrs):
+        if not attrs['role_ids'] and attrs['mode'] != bulk.REPLACE:
+            raise serializers.ValidationError({'role_ids': 'This list may not be empty.'})
+        return attrs
+
+
+class AuditLogSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AuditLog
+        fields = ['id', 'created_at', 'month', 'actor_id', 'actor_username', 'action', 'resource', 'object_id', 'changes']
+        read_only_fields = fields
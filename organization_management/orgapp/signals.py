@@ -0,0 +1,100 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import role_cache, versioning
+from .authentication import revoke_role_tokens, revoke_tokens
+from .models import Organization, Role, User
+
+
+def _evict(*user_ids):
+    role_cache.evict(*user_ids)
+    # A concurrent request may cache the old roles before this commits.
+    transaction.on_commit(lambda: role_cache.evict(*user_ids))
+
+
+def _access_changed(*user_ids):
+    # Cached role names and the claims in issued tokens both go stale.
+    _evict(*user_ids)
+    revoke_tokens(*user_ids)
+
+
+def _role_access_changed(*role_ids):
+    # Same for every holder of the roles, selected by a subquery.
+    _evict(*revoke_role_tokens(*role_ids))
+
+
+@receiver(m2m_changed, sender=User.roles.through)
+def evict_roles_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _access_changed(instance.pk)
+        return
+
+    # Reverse side: ``instance`` is a Role and ``pk_set`` holds user ids.
+    if action == 'pre_clear':
+        instance._role_cache_user_ids = revoke_role_tokens(instance.pk)
+    elif action == 'post_clear':
+        _evict(*getattr(instance, '_role_cache_user_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        _access_changed(*pk_set)
+
+
+@receiver(m2m_changed, sender=Role.permissions.through)
+def evict_roles_on_permission_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        versioning.bump('role')
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _role_access_changed(instance.pk)
+        return
+
+    # Reverse side: ``instance`` is a Permission and ``pk_set`` holds role ids.
+    if action == 'pre_clear':
+        instance._role_cache_role_ids = list(instance.roles.values_list('id', flat=True))
+    elif action == 'post_clear':
+        _role_access_changed(*getattr(instance, '_role_cache_role_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        _role_access_changed(*pk_set)
+
+
+@receiver(post_save, sender=Role)
+def evict_roles_on_role_save(sender, instance, created, **kwargs):
+    # Only the name reaches cached role names and token claims.
+    if not created and instance.name != getattr(instance, '_loaded_name', None):
+        _role_access_changed(instance.pk)
+    instance._loaded_name = instance.name
+
+
+@receiver(pre_delete, sender=Role)
+def revoke_role_holders(sender, instance, **kwargs):
+    # Memberships are gone by post_delete.
+    instance._role_cache_user_ids = revoke_role_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=Role)
+def evict_roles_on_role_delete(sender, instance, **kwargs):
+    _evict(*getattr(instance, '_role_cache_user_ids', []))
+
+
+@receiver(post_delete, sender=User)
+def evict_roles_on_user_delete(sender, instance, **kwargs):
+    _evict(instance.pk)
+
+
+@receiver(post_save, sender=Organization)
+@receiver(post_delete, sender=Organization)
+def bump_organization_version(sender, **kwargs):
+    versioning.bump('organization')
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def bump_role_version(sender, **kwargs):
+    versioning.bump('role')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_user_version(sender, **kwargs):
+    versioning.bump('user')
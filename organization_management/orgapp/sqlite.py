@@ -0,0 +1,115 @@
+"""
+SQLite settings for concurrent use.
+
+Every new SQLite connection gets the pragmas in ``ORGAPP_SQLITE_PRAGMAS``;
+``busy_timeout`` makes a blocked writer wait instead of failing at once. In
+WAL mode readers keep working while a write transaction is open, but the
+journal mode is stored in the database file rather than set per connection,
+so it is left to deployments: adding ``journal_mode`` here would rewrite the
+development database the first time any command opens it.
+
+SQLite still allows a single writer, and a deferred transaction that starts
+reading and then tries to write fails with "database is locked" straight
+away, whatever the timeout. ``run_write`` therefore serializes write
+transactions inside the process and retries the whole transaction when
+another process holds the lock. Reads keep using Django's per-thread
+connections and never take the lock.
+"""
+import threading
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DEFAULT_PRAGMAS = {
+    # Set first so that a journal_mode added by a deployment waits for other
+    # writers.
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative values are KiB rather than pages.
+    'cache_size': -64 * 1024,
+}
+
+_write_lock = threading.RLock()
+
+
+def get_pragmas():
+    return getattr(settings, 'ORGAPP_SQLITE_PRAGMAS', DEFAULT_PRAGMAS)
+
+
+def configure(connection, pragmas=None):
+    """
+    Applies ``pragmas`` (default ``ORGAPP_SQLITE_PRAGMAS``) to a DB-API
+    connection and returns the values SQLite reports back.
+    """
+    pragmas = get_pragmas() if pragmas is None else pragmas
+    applied = {}
+    cursor = connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            row = cursor.execute('PRAGMA %s = %s' % (name, value)).fetchone()
+            applied[name] = row[0] if row else value
+    finally:
+        cursor.close()
+    return applied
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        configure(connection.connection)
+
+
+def is_locked_error(exc):
+    return isinstance(exc, OperationalError) and 'is locked' in str(exc)
+
+
+def run_write(func, *args, using='default', **kwargs):
+    """
+    Calls ``func`` in a transaction on ``using`` while holding the process
+    write lock, retrying up to ``ORGAPP_SQLITE_WRITE_RETRIES`` times with
+    exponential backoff when SQLite reports the database as locked.
+
+    Inside an outer transaction, which cannot be restarted from here,
+    ``func`` runs once as part of it. Other databases take neither the lock
+    nor the retries.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with _write_lock if connection.vendor == 'sqlite' else nullcontext():
+            with transaction.atomic(using=using, savepoint=False):
+                return func(*args, **kwargs)
+
+    retries = getattr(settings, 'ORGAPP_SQLITE_WRITE_RETRIES', 5)
+    backoff = getattr(settings, 'ORGAPP_SQLITE_WRITE_BACKOFF', 0.05)
+    attempt = 0
+    while True:
+        with _write_lock:
+            try:
+                with transaction.atomic(using=using):
+                    return func(*args, **kwargs)
+            except OperationalError as exc:
+                if not is_locked_error(exc) or attempt >= retries:
+                    raise
+        time.sleep(backoff * 2 ** attempt)
+        attempt += 1
+
+
+class SerializedWriteMixin:
+    """
+    Runs the create, update and destroy steps of a viewset through
+    ``run_write``.
+    """
+
+    def perform_create(self, serializer):
+        run_write(super().perform_create, serializer)
+
+    def perform_update(self, serializer):
+        run_write(super().perform_update, serializer)
+
+    def perform_destroy(self, instance):
+        run_write(super().perform_destroy, instance)
@@ -1,7 +1,31 @@
+import csv
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import check_password, is_password_usable, make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.test import AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APITestCase
-from .models import Organization, Role, User
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from .models import AuditLog, Organization, Role, User, subtree_bounds
+from . import audit, bulk, exporters, fast, filters, hashing, renderers, response_cache, role_cache, routers, sqlite, versioning
+from .authentication import get_token_version
+from .importers import UserImporter, iter_rows
+from .views import UserViewSet
 
 from django.contrib.auth.models import Permission
  # Rest of your test methods...
@@ -518,3 +542,1814 @@ class AssignRoleTests(APITestCase):
         data = {'roles': [self.default_role.id]}
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class RoleLookupQueryTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.member_role = Role.objects.create(name='Member', description='Member role', organization=self.default_organization)
+        self.member = User.objects.create_user(
+            username='member',
+            email='member@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        self.member.roles.add(self.member_role)
+
+    def test_list_organizations_member_loads_roles_once(self):
+        self.client.force_authenticate(user=self.member)
+        url = reverse('organization-list')
+        # One query for the user's role names, one for the organizations.
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_user_without_roles_is_denied(self):
+        self.member.roles.clear()
+        self.client.force_authenticate(user=self.member)
+        url = reverse('organization-list')
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class RoleCacheTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.manager_role = Role.objects.create(name='Manager', description='Manager role', organization=self.default_organization)
+        self.member_role = Role.objects.create(name='Member', description='Member role', organization=self.default_organization)
+        self.superuser = User.objects.create_superuser(
+            username='superuser',
+            email='superuser@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        self.member = User.objects.create_user(
+            username='member',
+            email='member@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        self.member.roles.add(self.member_role)
+        role_cache.stats.reset()
+
+    def test_second_request_skips_role_query(self):
+        self.client.force_authenticate(user=self.member)
+        url = reverse('organization-list')
+        self.client.get(url)
+        # The organization list itself is served from the response cache.
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(role_cache.stats.as_dict(), {'hits': 1, 'misses': 1, 'evictions': 0})
+
+    def test_assign_role_evicts_entry(self):
+        self.assertEqual(role_cache.get_role_names(self.member), {'Member'})
+        self.client.force_authenticate(user=self.superuser)
+        url = reverse('user-assign-role', args=[self.member.id])
+        self.client.post(url, {'roles': [self.manager_role.id]}, format='json')
+        self.assertEqual(role_cache.get_role_names(self.member), {'Manager'})
+
+    def test_reverse_membership_change_evicts_entry(self):
+        self.assertEqual(role_cache.get_role_names(self.member), {'Member'})
+        self.manager_role.user_set.add(self.member)
+        self.assertEqual(role_cache.get_role_names(self.member), {'Manager', 'Member'})
+        self.member_role.user_set.clear()
+        self.assertEqual(role_cache.get_role_names(self.member), {'Manager'})
+
+    def test_role_rename_evicts_entry(self):
+        self.assertEqual(role_cache.get_role_names(self.member), {'Member'})
+        self.member_role.name = 'Owner'
+        self.member_role.save()
+        self.assertEqual(role_cache.get_role_names(self.member), {'Owner'})
+
+    def test_role_delete_evicts_entry(self):
+        self.assertEqual(role_cache.get_role_names(self.member), {'Member'})
+        self.member_role.delete()
+        self.assertEqual(role_cache.get_role_names(self.member), set())
+
+    def test_entry_cached_before_commit_is_evicted_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member.roles.add(self.manager_role)
+            # A concurrent request caching the pre-commit roles.
+            role_cache.get_cache().set('%s%s' % (role_cache.KEY_PREFIX, self.member.id), (('Member',), ()))
+        self.assertEqual(role_cache.get_role_names(self.member), {'Manager', 'Member'})
+
+    def test_user_delete_evicts_entry(self):
+        role_cache.get_role_names(self.member)
+        member_id = self.member.id
+        self.member.delete()
+        self.assertIsNone(role_cache.get_cache().get('%s%s' % (role_cache.KEY_PREFIX, member_id)))
+
+
+class RolePermissionTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.assigner_role = Role.objects.create(name='Assigner', description='Assigner role', organization=self.default_organization)
+        self.member_role = Role.objects.create(name='Member', description='Member role', organization=self.default_organization)
+        self.assign_roles = Permission.objects.get(content_type__app_label='orgapp', codename='assign_roles')
+        self.assigner = User.objects.create_user(
+            username='assigner',
+            email='assigner@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        self.member = User.objects.create_user(
+            username='member',
+            email='member@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        self.assigner.roles.add(self.assigner_role)
+
+    def test_role_permission_allows_assign(self):
+        self.assigner_role.permissions.add(self.assign_roles)
+        self.client.force_authenticate(user=self.assigner)
+        url = reverse('user-assign-role', args=[self.member.id])
+        response = self.client.post(url, {'roles': [self.member_role.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(self.member.roles.all()), [self.member_role])
+
+    def test_role_without_permission_is_denied(self):
+        self.client.force_authenticate(user=self.assigner)
+        url = reverse('user-bulk-assign-roles')
+        data = {'user_ids': [self.member.id], 'role_ids': [self.member_role.id]}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_compiled_access_loads_in_one_query(self):
+        self.assigner_role.permissions.add(self.assign_roles)
+        with self.assertNumQueries(1):
+            access = role_cache.get_access(self.assigner)
+        self.assertEqual(access.role_names, {'Assigner'})
+        self.assertEqual(access.permissions, {'orgapp.assign_roles'})
+        with self.assertNumQueries(0):
+            role_cache.get_access(self.assigner)
+
+    def test_permission_change_evicts_entry(self):
+        self.assertEqual(role_cache.get_access(self.assigner).permissions, set())
+        self.assigner_role.permissions.add(self.assign_roles)
+        self.assertEqual(role_cache.get_access(self.assigner).permissions, {'orgapp.assign_roles'})
+        self.assign_roles.roles.clear()
+        self.assertEqual(role_cache.get_access(self.assigner).permissions, set())
+
+    def test_manager_cannot_grant_permissions(self):
+        manager_role = Role.objects.create(name='Manager', description='Manager role', organization=self.default_organization)
+        self.assigner.roles.add(manager_role)
+        self.client.force_authenticate(user=self.assigner)
+        url = reverse('role-detail', args=[manager_role.id])
+        response = self.client.patch(url, {'permissions': [self.assign_roles.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(manager_role.permissions.exists())
+
+
+class UserListQueryTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.default_role = Role.objects.create(name='DefaultRole', description='Default Description', organization=self.default_organization)
+        self.superuser = User.objects.create_superuser(
+            username='superuser',
+            email='superuser@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+
+    def create_users(self, count, start=0):
+        for index in range(start, start + count):
+            user = User.objects.create(
+                username='user%d' % index,
+                email='user%d@example.com' % index,
+                organization=self.default_organization
+            )
+            user.roles.add(self.default_role)
+
+    def test_list_users_query_count_is_constant(self):
+        self.client.force_authenticate(user=self.superuser)
+        url = reverse('user-list')
+        self.create_users(3)
+        with self.assertNumQueries(2):
+            self.client.get(url)
+        self.create_users(20, start=3)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_users_hides_auth_fields(self):
+        self.client.force_authenticate(user=self.superuser)
+        response = self.client.get(reverse('user-list'))
+        user_data = response.data['results'][0]
+        for field in ('password', 'groups', 'user_permissions', 'is_superuser', 'last_login'):
+            self.assertNotIn(field, user_data)
+        self.assertIn('roles', user_data)
+
+    def test_create_user_hashes_password(self):
+        self.client.force_authenticate(user=self.superuser)
+        data = {
+            'username': 'user2',
+            'email': 'user2@example.com',
+            'password': 'password',
+            'organization': self.default_organization.id,
+            'roles': [self.default_role.id]
+        }
+        response = self.client.post(reverse('user-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user = User.objects.get(username='user2')
+        self.assertTrue(user.check_password('password'))
+        self.assertEqual(list(user.roles.all()), [self.default_role])
+
+class PaginationTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.superuser = User.objects.create_superuser(
+            username='superuser',
+            email='superuser@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        Role.objects.bulk_create([
+            Role(name='Role%d' % index, description='Description', organization=self.default_organization)
+            for index in range(5)
+        ])
+
+    def test_cursor_pages_cover_all_rows_in_order(self):
+        self.client.force_authenticate(user=self.superuser)
+        url = reverse('role-list') + '?page_size=2'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(role['id'] for role in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, list(Role.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_previous_cursor_returns_same_page(self):
+        self.client.force_authenticate(user=self.superuser)
+        first = self.client.get(reverse('role-list') + '?page_size=2')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+
+    @override_settings(ORGAPP_MAX_PAGE_SIZE=3)
+    def test_page_size_is_capped(self):
+        self.client.force_authenticate(user=self.superuser)
+        response = self.client.get(reverse('role-list') + '?page_size=500')
+        self.assertEqual(len(response.data['results']), 3)
+
+class BulkAssignRoleTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.superuser = User.objects.create_superuser(
+            username='superuser',
+            email='superuser@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        self.admin = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='password',
+            is_staff=True,
+            organization=self.default_organization
+        )
+        self.users = [
+            User.objects.create(username='user%d' % index, email='user%d@example.com' % index, organization=self.default_organization)
+            for index in range(5)
+        ]
+        self.role_a = Role.objects.create(name='RoleA', description='Description', organization=self.default_organization)
+        self.role_b = Role.objects.create(name='RoleB', description='Description', organization=self.default_organization)
+        self.url = reverse('user-bulk-assign-roles')
+
+    def user_ids(self):
+        return [user.id for user in self.users]
+
+    def test_bulk_add_roles(self):
+        self.users[0].roles.add(self.role_a)
+        self.client.force_authenticate(user=self.superuser)
+        data = {'user_ids': self.user_ids(), 'role_ids': [self.role_a.id, self.role_b.id], 'mode': 'add'}
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0], {'user_id': self.users[0].id, 'added': [self.role_b.id], 'removed': []})
+        for user in self.users:
+            self.assertEqual(set(user.roles.values_list('id', flat=True)), {self.role_a.id, self.role_b.id})
+
+    def test_bulk_remove_roles(self):
+        for user in self.users:
+            user.roles.add(self.role_a, self.role_b)
+        self.client.force_authenticate(user=self.superuser)
+        data = {'user_ids': self.user_ids(), 'role_ids': [self.role_a.id], 'mode': 'remove'}
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][1]['removed'], [self.role_a.id])
+        for user in self.users:
+            self.assertEqual(list(user.roles.values_list('id', flat=True)), [self.role_b.id])
+
+    def test_bulk_replace_roles(self):
+        self.users[0].roles.add(self.role_a)
+        self.client.force_authenticate(user=self.superuser)
+        data = {'user_ids': self.user_ids(), 'role_ids': [self.role_b.id], 'mode': 'replace'}
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.data['results'][0], {'user_id': self.users[0].id, 'added': [self.role_b.id], 'removed': [self.role_a.id]})
+        for user in self.users:
+            self.assertEqual(list(user.roles.values_list('id', flat=True)), [self.role_b.id])
+
+    def test_bulk_assign_query_count_is_bounded(self):
+        self.client.force_authenticate(user=self.superuser)
+        data = {'user_ids': self.user_ids(), 'role_ids': [self.role_a.id, self.role_b.id], 'mode': 'replace'}
+        # Two existence checks, savepoint, current pairs, delete, insert,
+        # token version bump, one audit insert, release.
+        with self.assertNumQueries(9):
+            self.client.post(self.url, data, format='json')
+
+    def test_bulk_assign_rejects_unknown_ids(self):
+        self.client.force_authenticate(user=self.superuser)
+        data = {'user_ids': self.user_ids() + [999999], 'role_ids': [self.role_a.id], 'mode': 'add'}
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('user_ids', response.data)
+        self.assertFalse(User.roles.through.objects.exists())
+
+    def test_bulk_assign_evicts_role_cache(self):
+        self.assertEqual(role_cache.get_role_names(self.users[0]), set())
+        self.client.force_authenticate(user=self.superuser)
+        data = {'user_ids': self.user_ids(), 'role_ids': [self.role_a.id], 'mode': 'add'}
+        self.client.post(self.url, data, format='json')
+        self.assertEqual(role_cache.get_role_names(self.users[0]), {'RoleA'})
+
+    def test_bulk_assign_admin_without_permission(self):
+        self.client.force_authenticate(user=self.admin)
+        data = {'user_ids': self.user_ids(), 'role_ids': [self.role_a.id], 'mode': 'add'}
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class ImportUsersTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.default_role = Role.objects.create(name='DefaultRole', description='Default Description', organization=self.default_organization)
+        self.admin = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='password',
+            is_staff=True,
+            organization=self.default_organization
+        )
+        self.url = reverse('user-import')
+
+    def upload(self, name, content, query=''):
+        self.client.force_authenticate(user=self.admin)
+        upload = SimpleUploadedFile(name, content.encode('utf-8'))
+        return self.client.post(self.url + query, {'file': upload}, format='multipart')
+
+    def test_import_csv(self):
+        content = (
+            'username,email,first_name,organization,roles,password\n'
+            'alice,alice@example.com,Alice,DefaultOrg,DefaultRole,secret123\n'
+            'bob,bob@example.com,Bob,DefaultOrg,,\n'
+        )
+        response = self.upload('users.csv', content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        alice = User.objects.get(username='alice')
+        self.assertTrue(alice.check_password('secret123'))
+        self.assertEqual(list(alice.roles.all()), [self.default_role])
+        self.assertFalse(User.objects.get(username='bob').has_usable_password())
+
+    def test_import_jsonl_reports_row_errors(self):
+        content = '\n'.join([
+            json.dumps({'username': 'carol', 'email': 'carol@example.com', 'organization': 'DefaultOrg', 'roles': ['DefaultRole']}),
+            json.dumps({'username': 'admin', 'email': 'other@example.com'}),
+            json.dumps({'username': 'dave', 'email': 'dave@example.com', 'organization': 'NoSuchOrg'}),
+            'not json',
+        ])
+        response = self.upload('users.jsonl', content)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['failed'], 3)
+        errors = {error['row']: error['errors'] for error in response.data['errors']}
+        self.assertEqual(sorted(errors), [2, 3, 4])
+        self.assertIn('username', errors[2])
+        self.assertIn('organization', errors[3])
+
+    def test_import_jsonl_reports_non_string_values(self):
+        content = '\n'.join([
+            json.dumps({'username': 123, 'email': 'ivy@example.com'}),
+            json.dumps({'username': 'jack', 'email': 'jack@example.com', 'organization': ['DefaultOrg']}),
+            json.dumps({'username': 'max', 'email': 'max@example.com', 'password': 42}),
+            json.dumps({'username': 'ned', 'email': 'ned@example.com'}),
+        ])
+        response = self.upload('users.jsonl', content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'], [
+            {'row': 1, 'errors': {'username': ['Expected a string.']}},
+            {'row': 2, 'errors': {'organization': ['Expected a string.']}},
+            {'row': 3, 'errors': {'password': ['Expected a string.']}},
+        ])
+
+    def test_import_jsonl_reports_roles_that_are_not_a_list(self):
+        content = '\n'.join([
+            json.dumps({'username': 'kim', 'email': 'kim@example.com', 'roles': 5}),
+            json.dumps({'username': 'lee', 'email': 'lee@example.com', 'roles': [{'name': 'DefaultRole'}]}),
+            json.dumps({'username': 'ned', 'email': 'ned@example.com', 'organization': 'DefaultOrg', 'roles': ['DefaultRole']}),
+        ])
+        response = self.upload('users.jsonl', content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'], [
+            {'row': 1, 'errors': {'roles': ['Expected a list of role names.']}},
+            {'row': 2, 'errors': {'roles': ['Expected a list of role names.']}},
+        ])
+
+    def test_import_dry_run_writes_nothing(self):
+        content = 'username,email\nerin,erin@example.com\n'
+        response = self.upload('users.csv', content, query='?dry_run=true')
+        self.assertEqual(response.data['created'], 1)
+        self.assertTrue(response.data['dry_run'])
+        self.assertFalse(User.objects.filter(username='erin').exists())
+
+    def test_import_query_count_depends_on_batches(self):
+        rows = ['username,email,organization,roles']
+        rows += ['user%d,user%d@example.com,DefaultOrg,DefaultRole' % (index, index) for index in range(50)]
+        lines = iter_rows(rows, 'csv')
+        # Two lookup maps, then per batch: two duplicate checks, user insert,
+        # id lookup, role insert, audit insert. The test transaction stands in
+        # for the per-batch one that run_write opens outside tests.
+        with self.assertNumQueries(2 + 6 * 2):
+            result = UserImporter(batch_size=25).run(lines)
+        self.assertEqual(result['created'], 50)
+        self.assertEqual(User.roles.through.objects.filter(role=self.default_role).count(), 50)
+
+    def test_import_users_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('username,email\nfrank,frank@example.com\nadmin,admin2@example.com\n')
+        self.addCleanup(os.remove, handle.name)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_users', handle.name, '--batch-size', '10', stdout=stdout, stderr=stderr)
+        self.assertIn('Created 1 users from 2 rows (1 failed).', stdout.getvalue())
+        self.assertIn('row 2:', stderr.getvalue())
+        self.assertTrue(User.objects.filter(username='frank').exists())
+
+    def test_import_prehashed_passwords(self):
+        encoded = make_password('secret123')
+        rows = iter_rows([
+            'username,email,password',
+            'gina,gina@example.com,%s' % encoded,
+            'hank,hank@example.com,plaintext',
+        ], 'csv')
+        result = UserImporter(prehashed=True).run(rows)
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(result['errors'], [{'row': 2, 'errors': {'password': ['Expected an encoded password hash.']}}])
+        gina = User.objects.get(username='gina')
+        self.assertEqual(gina.password, encoded)
+        self.assertTrue(gina.check_password('secret123'))
+
+
+class PasswordHashingTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.default_role = Role.objects.create(name='DefaultRole', description='Default Description', organization=self.default_organization)
+        self.admin = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='password',
+            is_staff=True,
+            organization=self.default_organization
+        )
+        self.url = reverse('user-bulk-create')
+
+    def test_hash_passwords_in_pool(self):
+        self.addCleanup(hashing.shutdown)
+        passwords = ['secret%d' % index for index in range(4)] + [None]
+        with override_settings(ORGAPP_PASSWORD_HASH_WORKERS=2, ORGAPP_PASSWORD_HASH_POOL_MIN=2):
+            encoded = hashing.hash_passwords(passwords)
+        for password, value in zip(passwords[:4], encoded):
+            self.assertTrue(check_password(password, value))
+        self.assertFalse(is_password_usable(encoded[4]))
+
+    def test_single_create_hashes_outside_write_lock(self):
+        self.client.force_authenticate(user=self.admin)
+        held = []
+
+        def hash_password(password):
+            held.append(sqlite._write_lock._is_owned())
+            return make_password(password)
+
+        data = {'username': 'single', 'email': 'single@example.com', 'password': 'secret', 'roles': [self.default_role.id]}
+        with mock.patch('orgapp.serializers.make_password', side_effect=hash_password):
+            response = self.client.post(reverse('user-list'), data, format='json')
+            self.client.patch(reverse('user-detail', args=[response.data['id']]), {'password': 'changed'}, format='json')
+        self.assertEqual(held, [False, False])
+        self.assertTrue(User.objects.get(username='single').check_password('changed'))
+
+    def test_default_workers_leave_cpus_to_other_processes(self):
+        with override_settings(ORGAPP_PASSWORD_HASH_WORKERS=None):
+            for cpus, workers in ((1, 1), (4, 2), (32, 4)):
+                with mock.patch('os.cpu_count', return_value=cpus):
+                    self.assertEqual(hashing.get_workers(), workers)
+
+    def test_is_password_hash(self):
+        self.assertTrue(hashing.is_password_hash(make_password('secret')))
+        self.assertFalse(hashing.is_password_hash('secret'))
+        self.assertFalse(hashing.is_password_hash(''))
+
+    def test_bulk_create_users(self):
+        self.client.force_authenticate(user=self.admin)
+        data = [
+            {'username': 'user%d' % index, 'email': 'user%d@example.com' % index, 'password': 'secret%d' % index,
+             'organization': self.default_organization.id, 'roles': [self.default_role.id]}
+            for index in range(3)
+        ]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([user['username'] for user in response.data], ['user0', 'user1', 'user2'])
+        self.assertEqual(response.data[0]['roles'], [self.default_role.id])
+        self.assertNotIn('password', response.data[0])
+        self.assertTrue(User.objects.get(username='user2').check_password('secret2'))
+
+    def test_bulk_create_inserts_once(self):
+        self.client.force_authenticate(user=self.admin)
+        data = [
+            {'username': 'user%d' % index, 'email': 'user%d@example.com' % index, 'password': 'secret', 'roles': [self.default_role.id]}
+            for index in range(20)
+        ]
+        with CaptureQueriesContext(connection) as captured:
+            self.client.post(self.url, data, format='json')
+        inserts = [query for query in captured.captured_queries if query['sql'].startswith('INSERT INTO "orgapp_user"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(User.objects.filter(username__startswith='user').count(), 20)
+
+    def test_bulk_create_validation_queries_do_not_grow(self):
+        self.client.force_authenticate(user=self.admin)
+        counts = []
+        for size, offset in ((2, 0), (20, 100)):
+            data = [
+                {'username': 'user%d' % index, 'email': 'user%d@example.com' % index, 'password': 'secret',
+                 'organization': self.default_organization.id, 'roles': [self.default_role.id]}
+                for index in range(offset, offset + size)
+            ]
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.post(self.url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            counts.append(len(captured.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_bulk_create_rejects_taken_and_unknown_values(self):
+        self.client.force_authenticate(user=self.admin)
+        data = [
+            {'username': 'admin', 'email': 'new@example.com', 'password': 'secret', 'roles': [self.default_role.id]},
+            {'username': 'new', 'email': 'admin@example.com', 'password': 'secret', 'roles': [self.default_role.id]},
+        ]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0]['username'], ['A user with that username already exists.'])
+        self.assertIn('email', response.data[1])
+        data = [{'username': 'new', 'email': 'new@example.com', 'password': 'secret', 'organization': 999, 'roles': [998, 'x']}]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data[0]), {'organization', 'roles'})
+        self.assertFalse(User.objects.filter(username='new').exists())
+
+    def test_bulk_create_rejects_duplicates_in_request(self):
+        self.client.force_authenticate(user=self.admin)
+        data = [
+            {'username': 'user', 'email': 'one@example.com', 'password': 'secret', 'roles': [self.default_role.id]},
+            {'username': 'user', 'email': 'two@example.com', 'password': 'secret', 'roles': [self.default_role.id]},
+        ]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('username', response.data[1])
+        self.assertFalse(User.objects.filter(username='user').exists())
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.role_a = Role.objects.create(name='RoleA', description='Description', organization=self.default_organization)
+        self.role_b = Role.objects.create(name='RoleB', description='Description', organization=self.default_organization)
+        self.admin = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='password',
+            is_staff=True,
+            organization=self.default_organization
+        )
+        self.admin.roles.add(self.role_a, self.role_b)
+        self.member = User.objects.create_user(
+            username='member',
+            email='member@example.com',
+            password='password',
+        )
+
+    def test_export_users_ndjson(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('export', args=['users']))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([record['username'] for record in records], ['admin', 'member'])
+        self.assertEqual(records[0]['organization'], 'DefaultOrg')
+        self.assertEqual(records[0]['roles'], ['RoleA', 'RoleB'])
+        self.assertIsNone(records[1]['organization'])
+        self.assertNotIn('password', records[0])
+
+    def test_export_roles_csv(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('export', args=['roles']) + '?file_format=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['name'] for row in rows], ['RoleA', 'RoleB'])
+        self.assertEqual(rows[0]['organization'], 'DefaultOrg')
+
+    def test_export_users_queries_per_chunk(self):
+        # One query for the user rows plus one role lookup per chunk.
+        with self.assertNumQueries(3):
+            records = list(exporters.iter_records('users', chunk_size=1))
+        self.assertEqual(len(records), 2)
+
+    def test_export_requires_admin(self):
+        self.client.force_authenticate(user=self.member)
+        response = self.client.get(reverse('export', args=['users']))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_data_command(self):
+        stdout = io.StringIO()
+        call_command('export_data', 'users', '--format', 'csv', stdout=stdout)
+        rows = list(csv.DictReader(io.StringIO(stdout.getvalue())))
+        self.assertEqual(rows[0]['roles'], 'RoleA;RoleB')
+
+class OrganizationCountTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.other_organization = Organization.objects.create(name='OtherOrg', description='Other Description')
+        self.role_a = Role.objects.create(name='RoleA', description='Description', organization=self.default_organization)
+        self.role_b = Role.objects.create(name='RoleB', description='Description', organization=self.default_organization)
+        self.superuser = User.objects.create_superuser(
+            username='superuser',
+            email='superuser@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        for index in range(3):
+            user = User.objects.create(username='user%d' % index, email='user%d@example.com' % index, organization=self.default_organization)
+            user.roles.add(self.role_a)
+        self.superuser.roles.add(self.role_a, self.role_b)
+
+    def test_list_organizations_includes_counts(self):
+        self.client.force_authenticate(user=self.superuser)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('organization-list'))
+        counts = {row['name']: (row['user_count'], row['role_count']) for row in response.data['results']}
+        self.assertEqual(counts, {'DefaultOrg': (4, 2), 'OtherOrg': (0, 0)})
+
+    def test_summary_counts_members_per_role(self):
+        self.client.force_authenticate(user=self.superuser)
+        url = reverse('organization-summary', args=[self.default_organization.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user_count'], 4)
+        self.assertEqual(
+            [(role['name'], role['member_count']) for role in response.data['roles']],
+            [('RoleA', 4), ('RoleB', 1)]
+        )
+
+    def test_summary_is_cached(self):
+        self.client.force_authenticate(user=self.superuser)
+        url = reverse('organization-summary', args=[self.default_organization.id])
+        self.client.get(url)
+        # Only the object lookup runs once the summary is cached.
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.data['role_count'], 2)
+
+QUERY_PROFILING = {'ENABLED': True, 'PATH_PREFIXES': ['/api/'], 'DUPLICATE_THRESHOLD': 3, 'SLOWEST': 2}
+
+
+class QueryProfilingMiddlewareTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.default_role = Role.objects.create(name='DefaultRole', description='Default Description', organization=self.default_organization)
+        self.superuser = User.objects.create_superuser(
+            username='superuser',
+            email='superuser@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        for index in range(5):
+            user = User.objects.create(username='user%d' % index, email='user%d@example.com' % index, organization=self.default_organization)
+            user.roles.add(self.default_role)
+
+    def test_disabled_by_default(self):
+        self.client.force_authenticate(user=self.superuser)
+        response = self.client.get(reverse('user-list'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(ORGAPP_QUERY_PROFILING=QUERY_PROFILING)
+    def test_user_list_is_not_flagged(self):
+        self.client.force_authenticate(user=self.superuser)
+        with self.assertLogs('orgapp.queries', level='INFO') as logs:
+            response = self.client.get(reverse('user-list'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="2 queries"$')
+        report = json.loads(logs.records[0].getMessage())
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        self.assertEqual(report['query_count'], 2)
+        self.assertEqual(report['duplicates'], [])
+        self.assertEqual(len(report['slowest']), 2)
+        self.assertEqual(report['path'], reverse('user-list'))
+
+    @override_settings(ORGAPP_QUERY_PROFILING=QUERY_PROFILING)
+    @override_settings(ORGAPP_FAST_LIST_SERIALIZERS=False)
+    def test_user_list_without_prefetch_is_flagged(self):
+        self.client.force_authenticate(user=self.superuser)
+        with mock.patch.object(UserViewSet, 'queryset', User.objects.all()):
+            with self.assertLogs('orgapp.queries', level='WARNING') as logs:
+                response = self.client.get(reverse('user-list'))
+        self.assertIn('db-duplicates;desc="1 repeated statements"', response['Server-Timing'])
+        report = json.loads(logs.records[0].getMessage())
+        self.assertEqual(report['duplicates'][0]['count'], 6)
+        self.assertIn('orgapp_user_roles', report['duplicates'][0]['sql'])
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.default_role = Role.objects.create(name='DefaultRole', description='Default Description', organization=self.default_organization)
+        self.superuser = User.objects.create_superuser(
+            username='superuser',
+            email='superuser@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        self.client.force_authenticate(user=self.superuser)
+
+    def test_unchanged_list_returns_304_without_queries(self):
+        url = reverse('organization-list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_detail_if_modified_since(self):
+        url = reverse('role-detail', args=[self.default_role.id])
+        response = self.client.get(url)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_write_changes_etag(self):
+        url = reverse('role-list')
+        etag = self.client.get(url)['ETag']
+        Role.objects.create(name='NewRole', description='Description', organization=self.default_organization)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_organization_etag_follows_counts(self):
+        url = reverse('organization-list')
+        etag = self.client.get(url)['ETag']
+        User.objects.create(username='user1', email='user1@example.com', organization=self.default_organization)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['user_count'], 2)
+
+    def test_etag_depends_on_query_string(self):
+        url = reverse('role-list')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url + '?page_size=1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_etag_follows_callers_organization(self):
+        other_organization = Organization.objects.create(name='OtherOrg', description='Other Description')
+        other_role = Role.objects.create(name='OtherRole', description='Other Description', organization=other_organization)
+        manager_role = Role.objects.create(name='Manager', description='Manager role', organization=self.default_organization)
+        manager = User.objects.create_user(
+            username='manager', email='manager@example.com', password='password', organization=self.default_organization,
+        )
+        manager.roles.add(manager_role)
+        self.client.force_authenticate(user=manager)
+        url = reverse('role-list')
+        etag = self.client.get(url)['ETag']
+        manager.organization = other_organization
+        manager.save()
+        self.client.force_authenticate(user=User.objects.get(pk=manager.pk))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in response.data['results']], [other_role.id])
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.default_role = Role.objects.create(name='DefaultRole', description='Default Description', organization=self.default_organization)
+        self.superuser = User.objects.create_superuser(
+            username='superuser',
+            email='superuser@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        self.client.force_authenticate(user=self.superuser)
+
+    def test_list_is_served_from_cache(self):
+        url = reverse('role-list')
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second.data, first.data)
+
+    def test_pagination_links_follow_host(self):
+        for index in range(2):
+            Role.objects.create(name='Role%d' % index, description='Paged', organization=self.default_organization)
+        url = reverse('role-list') + '?page_size=1'
+        for host in ('localhost', '127.0.0.1'):
+            response = self.client.get(url, HTTP_HOST=host)
+            self.assertTrue(response.data['next'].startswith('http://%s/' % host), response.data['next'])
+
+    def test_save_invalidates_cached_list(self):
+        url = reverse('role-list')
+        self.client.get(url)
+        self.default_role.name = 'Renamed'
+        self.default_role.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data['results'][0]['name'], 'Renamed')
+
+    def test_delete_invalidates_cached_list(self):
+        url = reverse('organization-list')
+        self.client.get(url)
+        self.default_role.delete()
+        response = self.client.get(url)
+        self.assertEqual(response.data['results'][0]['role_count'], 0)
+
+    def test_version_is_bumped_again_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.default_role.name = 'Renamed'
+            self.default_role.save()
+            before_commit = versioning.get_version('role')
+        self.assertNotEqual(versioning.get_version('role'), before_commit)
+
+    def test_pages_are_cached_separately(self):
+        Role.objects.create(name='Role2', description='Description', organization=self.default_organization)
+        first = self.client.get(reverse('role-list') + '?page_size=1')
+        second = self.client.get(first.data['next'])
+        self.assertNotEqual(first.data['results'], second.data['results'])
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'value': 1}
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: response_cache.get_or_compute('stampede', compute), range(8)))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'value': 1}] * 8)
+
+class AsyncReadViewTests(APITransactionTestCase):
+    # Async views run in worker threads with their own connections, which
+    # only see committed data.
+
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.default_role = Role.objects.create(name='DefaultRole', description='Default Description', organization=self.default_organization)
+        self.superuser = User.objects.create_superuser(
+            username='superuser',
+            email='superuser@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        self.member = User.objects.create_user(
+            username='member',
+            email='member@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        self.async_client = AsyncClient()
+
+    def async_get(self, url):
+        async def get():
+            return await self.async_client.get(url)
+        return async_to_sync(get)()
+
+    def test_async_list_matches_sync_list(self):
+        self.client.force_login(self.superuser)
+        self.async_client.force_login(self.superuser)
+        for name in ('organization-list', 'role-list', 'user-list'):
+            sync_response = self.client.get(reverse(name))
+            async_response = self.async_get(reverse('async-' + name))
+            self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+            self.assertEqual(async_response.json(), sync_response.json())
+
+    def test_async_retrieve(self):
+        self.async_client.force_login(self.superuser)
+        response = self.async_get(reverse('async-user-detail', args=[self.member.id]))
+        self.assertEqual(response.json()['username'], 'member')
+
+    def test_async_permissions_apply(self):
+        self.async_client.force_login(self.member)
+        response = self.async_get(reverse('async-user-list'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class SqliteTuningTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.path = os.path.join(directory, 'tuning.sqlite3')
+
+    def open(self, journal_mode):
+        raw = sqlite3.connect(self.path, timeout=0, isolation_level=None, check_same_thread=False)
+        self.addCleanup(raw.close)
+        sqlite.configure(raw, dict(sqlite.DEFAULT_PRAGMAS, busy_timeout=0, journal_mode=journal_mode))
+        return raw
+
+    def test_pragmas_applied_to_new_connections(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 5000)
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)
+            self.assertEqual(cursor.execute('PRAGMA cache_size').fetchone()[0], -64 * 1024)
+
+    def test_configure_reports_wal(self):
+        raw = sqlite3.connect(self.path)
+        self.addCleanup(raw.close)
+        self.assertEqual(sqlite.configure(raw, {'journal_mode': 'WAL'})['journal_mode'], 'wal')
+
+    def test_default_pragmas_keep_journal_mode(self):
+        raw = sqlite3.connect(self.path)
+        self.addCleanup(raw.close)
+        sqlite.configure(raw)
+        self.assertEqual(raw.execute('PRAGMA journal_mode').fetchone()[0], 'delete')
+
+    def test_reads_do_not_block_behind_writer_in_wal(self):
+        writer = self.open('WAL')
+        writer.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+        reader = self.open('WAL')
+        writer.execute('BEGIN EXCLUSIVE')
+        writer.execute('INSERT INTO item DEFAULT VALUES')
+        self.assertEqual(reader.execute('SELECT COUNT(*) FROM item').fetchone()[0], 0)
+        writer.execute('COMMIT')
+        self.assertEqual(reader.execute('SELECT COUNT(*) FROM item').fetchone()[0], 1)
+
+    def test_reads_block_behind_writer_in_rollback_journal(self):
+        writer = self.open('DELETE')
+        writer.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+        reader = self.open('DELETE')
+        writer.execute('BEGIN EXCLUSIVE')
+        with self.assertRaisesMessage(sqlite3.OperationalError, 'database is locked'):
+            reader.execute('SELECT COUNT(*) FROM item').fetchone()
+        writer.execute('ROLLBACK')
+
+
+@override_settings(ORGAPP_SQLITE_WRITE_RETRIES=2, ORGAPP_SQLITE_WRITE_BACKOFF=0)
+class SqliteWriteTests(APITransactionTestCase):
+    def test_run_write_retries_locked_database(self):
+        write = mock.Mock(side_effect=[OperationalError('database is locked'), 'written'])
+        self.assertEqual(sqlite.run_write(write, 1), 'written')
+        self.assertEqual(write.call_count, 2)
+
+    def test_run_write_gives_up_after_retries(self):
+        write = mock.Mock(side_effect=OperationalError('database is locked'))
+        with self.assertRaises(OperationalError):
+            sqlite.run_write(write)
+        self.assertEqual(write.call_count, 3)
+
+    def test_run_write_does_not_retry_other_errors(self):
+        write = mock.Mock(side_effect=OperationalError('no such table: missing'))
+        with self.assertRaises(OperationalError):
+            sqlite.run_write(write)
+        self.assertEqual(write.call_count, 1)
+
+    def test_run_write_rolls_back_failed_attempt(self):
+        organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        attempts = []
+
+        def write():
+            attempts.append(Role.objects.create(name='Role%d' % len(attempts), organization=organization))
+            if len(attempts) == 1:
+                raise OperationalError('database is locked')
+
+        sqlite.run_write(write)
+        self.assertEqual(list(Role.objects.values_list('name', flat=True)), ['Role1'])
+
+
+@override_settings(ORGAPP_DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(APITransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.admin = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='password',
+            is_staff=True,
+            organization=self.default_organization
+        )
+        self.client.force_authenticate(user=self.admin)
+
+    def get_by_alias(self, url):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(primary.captured_queries), len(replica.captured_queries)
+
+    def test_list_reads_from_replica(self):
+        primary, replica = self.get_by_alias(reverse('user-list'))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_retrieve_reads_from_replica(self):
+        url = reverse('organization-detail', args=[self.default_organization.id])
+        self.assertEqual(self.get_by_alias(url), (0, 1))
+
+    def test_extra_read_action_reads_from_replica(self):
+        url = reverse('organization-descendants', args=[self.default_organization.id])
+        primary, replica = self.get_by_alias(url)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_write_goes_to_primary_and_pins_user(self):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.post(reverse('organization-list'), {'name': 'NewOrg', 'description': 'New'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(any(query['sql'].startswith('INSERT') for query in primary.captured_queries))
+        self.assertEqual(replica.captured_queries, [])
+        self.assertTrue(routers.is_pinned(self.admin.pk))
+
+        primary, replica = self.get_by_alias(reverse('user-list'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_cached_list_is_computed_on_primary(self):
+        self.assertEqual(self.get_by_alias(reverse('organization-list')), (1, 0))
+        self.assertEqual(self.get_by_alias(reverse('organization-list')), (0, 0))
+
+    def test_failed_write_does_not_pin(self):
+        response = self.client.post(reverse('organization-list'), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(routers.is_pinned(self.admin.pk))
+
+    @override_settings(ORGAPP_DATABASE_REPLICAS=[])
+    def test_without_replicas_reads_from_primary(self):
+        primary, replica = self.get_by_alias(reverse('user-list'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_router_outside_read_actions(self):
+        router = routers.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(User))
+        with routers.read_from('replica'):
+            self.assertEqual(router.db_for_read(User), 'replica')
+            self.assertEqual(router.db_for_write(User), 'default')
+        self.assertIsNone(routers.current_read_alias())
+
+
+class FastListTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.other_organization = Organization.objects.create(
+            name='Zürich \u2028 Ünit', description='Line\u2029break "quoted" \\ ✓', parent=self.default_organization
+        )
+        self.manager_role = Role.objects.create(name='Manager', description='Manager role', organization=self.default_organization)
+        self.member_role = Role.objects.create(name='Mitglied ✓', description='', organization=self.other_organization)
+        self.manager_role.permissions.add(Permission.objects.get(codename='assign_roles'))
+        self.superuser = User.objects.create_superuser(
+            username='superuser',
+            email='superuser@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        self.user = User.objects.create_user(username='jörg', email='jorg@example.com', password='password', first_name='Jörg')
+        self.user.roles.set([self.manager_role, self.member_role])
+        User.objects.filter(pk=self.user.pk).update(date_joined=datetime(2024, 2, 29, 12, 34, 56, 789, tzinfo=timezone.utc))
+        self.client.force_authenticate(user=self.superuser)
+
+    def get_both(self, url):
+        responses = []
+        for enabled in (False, True):
+            response_cache.get_cache().clear()
+            with override_settings(ORGAPP_FAST_LIST_SERIALIZERS=enabled):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            responses.append(response.content)
+        return responses
+
+    def test_list_bytes_match_serializer_output(self):
+        content = {}
+        for name in ('organization-list', 'role-list', 'user-list'):
+            slow, fast = self.get_both(reverse(name))
+            self.assertEqual(fast, slow, name)
+            content[name] = fast
+        self.assertIn('Zürich \\u2028 Ünit'.encode(), content['organization-list'])
+        self.assertIn('"parent":null'.encode(), content['organization-list'])
+        self.assertIn('Mitglied ✓'.encode(), content['role-list'])
+        self.assertIn(b'"2024-02-29T12:34:56.000789Z"', content['user-list'])
+
+    def test_extra_list_actions_match(self):
+        slow, fast = self.get_both(reverse('organization-descendants', args=[self.default_organization.id]))
+        self.assertEqual(fast, slow)
+
+    def test_user_list_queries(self):
+        User.objects.create_user(username='second', email='second@example.com', password='password')
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('user-list'))
+        rows = {row['username']: row for row in response.json()['results']}
+        self.assertEqual(sorted(rows['jörg']['roles']), sorted([self.manager_role.id, self.member_role.id]))
+        self.assertEqual(rows['second']['roles'], [])
+        self.assertIsNone(rows['second']['organization'])
+
+    def test_lists_go_through_row_builder(self):
+        for name in ('organization-list', 'role-list', 'user-list'):
+            response_cache.get_cache().clear()
+            with mock.patch('orgapp.fast.RowBuilder.build', autospec=True, side_effect=fast.RowBuilder.build) as build:
+                response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            build.assert_called_once()
+
+    def test_browsable_api_uses_serializer(self):
+        with mock.patch('orgapp.fast.RowBuilder.build') as build:
+            response = self.client.get(reverse('user-list'), HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        build.assert_not_called()
+
+    def test_renderer_without_orjson_matches(self):
+        data = {'name': 'a\u2028b ✓', 'date': self.user.date_joined, 'none': None, 'items': [1, True]}
+        fast = renderers.FastJSONRenderer().render(data)
+        with mock.patch.object(renderers, 'orjson', None):
+            fallback = renderers.FastJSONRenderer().render(data)
+        self.assertEqual(fast, fallback)
+
+
+class FieldsetTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.manager_role = Role.objects.create(name='Manager', description='Manager role', organization=self.default_organization)
+        self.member_role = Role.objects.create(name='Member', description='Member role', organization=self.default_organization)
+        self.superuser = User.objects.create_superuser(
+            username='superuser',
+            email='superuser@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        for index in range(3):
+            user = User.objects.create_user(
+                username='user%d' % index, email='user%d@example.com' % index, password='password',
+                organization=self.default_organization,
+            )
+            user.roles.set([self.manager_role, self.member_role])
+        self.client.force_authenticate(user=self.superuser)
+
+    def test_sparse_fields_load_only_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('user-list') + '?fields=id,username')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data['results'][0]), ['id', 'username'])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('password', queries[0]['sql'])
+        self.assertNotIn('orgapp_user_roles', queries[0]['sql'])
+
+    def test_expand_embeds_relations_with_constant_queries(self):
+        url = reverse('user-list') + '?expand=roles,organization'
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        row = response.data['results'][1]
+        self.assertEqual(row['organization']['name'], 'DefaultOrg')
+        self.assertNotIn('user_count', row['organization'])
+        self.assertEqual([role['name'] for role in row['roles']], ['Manager', 'Member'])
+        User.objects.create_user(username='user3', email='user3@example.com', password='password').roles.add(self.member_role)
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+    def test_fields_and_expand_combine(self):
+        response = self.client.get(reverse('user-detail', args=[self.superuser.id]) + '?fields=id&expand=organization')
+        self.assertEqual(response.data, {
+            'id': self.superuser.id,
+            'organization': {
+                'id': self.default_organization.id,
+                'name': 'DefaultOrg',
+                'description': 'Default Description',
+                'created_at': response.data['organization']['created_at'],
+                'path': self.default_organization.path,
+                'parent': None,
+            },
+        })
+
+    def test_organization_counts_only_when_requested(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('organization-list') + '?fields=id,name')
+        self.assertEqual(list(response.data['results'][0]), ['id', 'name'])
+        self.assertNotIn('COUNT', queries[-1]['sql'])
+        response = self.client.get(reverse('organization-list') + '?fields=id,user_count')
+        self.assertEqual(response.data['results'][0]['user_count'], 4)
+
+    def test_unknown_names_are_rejected(self):
+        response = self.client.get(reverse('user-list') + '?fields=id,secret')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.data)
+        response = self.client.get(reverse('user-list') + '?fields=password')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('role-list') + '?expand=permissions')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('expand', response.data)
+
+    def test_cached_expansion_follows_embedded_table(self):
+        url = reverse('role-list') + '?expand=organization'
+        self.assertEqual(self.client.get(url).data['results'][0]['organization']['name'], 'DefaultOrg')
+        self.default_organization.name = 'Renamed'
+        self.default_organization.save()
+        self.assertEqual(self.client.get(url).data['results'][0]['organization']['name'], 'Renamed')
+
+    def test_writes_ignore_fieldset(self):
+        url = reverse('user-detail', args=[self.superuser.id]) + '?fields=id'
+        response = self.client.patch(url, {'first_name': 'Super'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['first_name'], 'Super')
+
+    def test_other_actions_ignore_fieldset(self):
+        url = reverse('organization-summary', args=[self.default_organization.id]) + '?fields=name&expand=parent'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['name'], response.data['user_count']), ('DefaultOrg', 4))
+        child = Organization.objects.create(name='Child', parent=self.default_organization)
+        response = self.client.get(reverse('organization-descendants', args=[self.default_organization.id]) + '?fields=id')
+        self.assertEqual(response.data['results'], [{'id': child.id}])
+
+
+class UserFilterTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.other_organization = Organization.objects.create(name='OtherOrg', description='Other Description')
+        self.manager_role = Role.objects.create(name='Manager', description='Manager role', organization=self.default_organization)
+        self.member_role = Role.objects.create(name='Member', description='Member role', organization=self.default_organization)
+        self.other_manager_role = Role.objects.create(name='Manager', description='Manager role', organization=self.other_organization)
+        self.superuser = User.objects.create_superuser(
+            username='superuser',
+            email='superuser@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        self.alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='password', first_name='Alice', last_name='Smith',
+            organization=self.default_organization,
+        )
+        self.alan = User.objects.create_user(
+            username='alan', email='al@corp.example', password='password', first_name='Alan', last_name='Smithers',
+            organization=self.other_organization, is_active=False,
+        )
+        self.bob = User.objects.create_user(
+            username='bob', email='bob@example.com', password='password', first_name='Bob', last_name='Jones',
+            organization=self.default_organization,
+        )
+        self.alice.roles.add(self.manager_role)
+        self.bob.roles.add(self.member_role)
+        self.alan.roles.add(self.other_manager_role)
+        self.client.force_authenticate(user=self.superuser)
+
+    def usernames(self, query, name='user-list'):
+        response = self.client.get(reverse(name) + '?' + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return [row.get('username', row.get('name')) for row in response.data['results']]
+
+    def test_exact_and_boolean_filters(self):
+        self.assertEqual(self.usernames('role=%d' % self.manager_role.id), ['alice'])
+        self.assertEqual(self.usernames('role_name=Manager'), ['alice', 'alan'])
+        self.assertEqual(self.usernames('organization=%d&role_name=Manager' % self.default_organization.id), ['alice'])
+        self.assertEqual(self.usernames('is_active=false'), ['alan'])
+        self.assertEqual(self.usernames('is_staff=true'), ['superuser'])
+        self.assertEqual(self.usernames('is_active=true&is_staff=false'), ['alice', 'bob'])
+
+    def test_role_name_returns_each_user_once(self):
+        self.alice.roles.add(self.other_manager_role)
+        self.assertEqual(self.usernames('role_name=Manager'), ['alice', 'alan'])
+        self.assertEqual(self.usernames('role_name=Manager&page_size=1'), ['alice'])
+
+    def test_prefix_filters_use_ranges(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.usernames('username=al'), ['alice', 'alan'])
+        sql = queries[0]['sql']
+        self.assertIn('"orgapp_user"."username" >=', sql)
+        self.assertNotIn('LIKE', sql)
+        self.assertEqual(self.usernames('email=al@'), ['alan'])
+        self.assertEqual(self.usernames('name=Man', name='role-list'), ['Manager', 'Manager'])
+        self.assertEqual(filters.prefix_bounds('al'), ('al', 'am'))
+        self.assertEqual(filters.prefix_bounds('a\U0010ffff'), ('a\U0010ffff', 'b'))
+        self.assertEqual(filters.prefix_bounds('\U0010ffff'), ('\U0010ffff', None))
+        self.assertEqual(self.usernames('username=%F4%8F%BF%BF'), [])
+        self.assertEqual(self.usernames('username=a%F4%8F%BF%BF'), [])
+
+    def test_search_matches_word_prefixes(self):
+        self.assertEqual(self.usernames('search=smi'), ['alice', 'alan'])
+        self.assertEqual(self.usernames('search=al+smithers'), ['alan'])
+        self.assertEqual(self.usernames('search=corp'), ['alan'])
+        self.assertEqual(self.usernames('search=NEAR(%22x%22)+OR+bob'), [])
+        self.assertEqual(self.usernames('search=%22'), ['superuser', 'alice', 'alan', 'bob'])
+
+    def test_search_index_follows_writes(self):
+        self.bob.last_name = 'Builder'
+        self.bob.save()
+        self.assertEqual(self.usernames('search=builder'), ['bob'])
+        self.assertEqual(self.usernames('search=jones'), [])
+        self.bob.delete()
+        self.assertEqual(self.usernames('search=builder'), [])
+        bulk.create_users([{'username': 'carol', 'email': 'carol@example.com', 'password': 'password', 'roles': []}])
+        self.assertEqual(self.usernames('search=carol'), ['carol'])
+
+    def test_flag_filters_use_partial_indexes(self):
+        for query, index in (('is_active=false', 'orgapp_user_inactive_idx'), ('is_staff=true', 'orgapp_user_staff_idx')):
+            response = self.client.get(reverse('user-list') + '?' + query)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            plan = User.objects.filter(**{query.split('=')[0]: query.endswith('true')}).order_by('id').explain()
+            self.assertIn(index, plan)
+
+    def test_invalid_values_are_rejected(self):
+        for query in ('role=manager', 'is_active=maybe'):
+            response = self.client.get(reverse('user-list') + '?' + query)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(query.split('=')[0], response.data)
+
+
+class JwtAuthenticationTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.manager_role = Role.objects.create(name='Manager', description='Manager role', organization=self.default_organization)
+        self.member_role = Role.objects.create(name='Member', description='Member role', organization=self.default_organization)
+        self.superuser = User.objects.create_superuser(
+            username='superuser',
+            email='superuser@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        self.manager.roles.add(self.manager_role)
+
+    def obtain(self, username, password='password'):
+        response = self.client.post(reverse('token-obtain'), {'username': username, 'password': password}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_access_token_carries_claims(self):
+        access = AccessToken(self.obtain('manager')['access'])
+        self.assertEqual(access['user_id'], self.manager.id)
+        self.assertEqual(access['organization_id'], self.default_organization.id)
+        self.assertEqual(access['roles'], ['Manager'])
+        self.assertFalse(access['is_staff'])
+        self.assertEqual(access['token_version'], User.objects.get(pk=self.manager.pk).token_version)
+
+    def test_permission_checks_skip_user_and_role_queries(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.obtain('manager')['access'])
+        url = reverse('role-detail', args=[self.manager_role.id])
+        self.client.get(url)
+        # Only the role and its permissions: no session, user or
+        # role-membership lookups.
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_denied_without_queries(self):
+        member = User.objects.create_user(
+            username='member', email='member@example.com', password='password',
+            organization=self.default_organization,
+        )
+        member.roles.add(self.member_role)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.obtain('member')['access'])
+        get_token_version(member.pk)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('role-list'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_assign_role_revokes_token(self):
+        tokens = self.obtain('manager')
+        self.client.force_authenticate(user=self.superuser)
+        url = reverse('user-assign-role', args=[self.manager.id])
+        self.client.post(url, {'roles': [self.member_role.id]}, format='json')
+        self.client.force_authenticate(user=None)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + tokens['access'])
+        response = self.client.get(reverse('role-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.post(reverse('token-refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(AccessToken(response.data['access'])['roles'], ['Member'])
+
+    def test_only_role_rename_revokes_holders(self):
+        version = User.objects.get(pk=self.manager.pk).token_version
+        role = Role.objects.get(pk=self.manager_role.pk)
+        role.description = 'Edited'
+        role.save()
+        self.assertEqual(User.objects.get(pk=self.manager.pk).token_version, version)
+        role.name = 'Lead'
+        with CaptureQueriesContext(connection) as captured:
+            role.save()
+        self.assertEqual(User.objects.get(pk=self.manager.pk).token_version, version + 1)
+        update = [query['sql'] for query in captured.captured_queries if query['sql'].startswith('UPDATE "orgapp_user"')]
+        self.assertIn('IN (SELECT', update[0])
+        role.delete()
+        self.assertEqual(User.objects.get(pk=self.manager.pk).token_version, version + 2)
+
+    def test_deactivated_user_cannot_refresh(self):
+        tokens = self.obtain('manager')
+        self.client.force_authenticate(user=self.superuser)
+        response = self.client.patch(reverse('user-detail', args=[self.manager.id]), {'is_active': False}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(user=None)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + tokens['access'])
+        self.assertEqual(self.client.get(reverse('role-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse('token-refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_scoping_uses_token_organization(self):
+        other_organization = Organization.objects.create(name='OtherOrg', description='Other')
+        Role.objects.create(name='Other', description='Other role', organization=other_organization)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.obtain('manager')['access'])
+        response = self.client.get(reverse('role-list'))
+        self.assertEqual(sorted(role['name'] for role in response.data['results']), ['Manager', 'Member'])
+
+
+class OrganizationScopingTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.other_organization = Organization.objects.create(name='OtherOrg', description='Other Description')
+        self.manager_role = Role.objects.create(name='Manager', description='Manager role', organization=self.default_organization)
+        self.other_role = Role.objects.create(name='OtherRole', description='Other role', organization=self.other_organization)
+        self.admin = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='password',
+            is_staff=True,
+            organization=self.default_organization
+        )
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        self.manager.roles.add(self.manager_role)
+
+    def list_names(self, url_name):
+        response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['name'] for row in response.data['results']]
+
+    def test_manager_sees_own_organization_only(self):
+        self.client.force_authenticate(user=self.manager)
+        self.assertEqual(self.list_names('organization-list'), ['DefaultOrg'])
+        self.assertEqual(self.list_names('role-list'), ['Manager'])
+
+    def test_manager_cannot_retrieve_other_organization_role(self):
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get(reverse('role-detail', args=[self.other_role.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_staff_sees_every_organization(self):
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(self.list_names('organization-list'), ['DefaultOrg', 'OtherOrg'])
+        self.assertEqual(self.list_names('role-list'), ['Manager', 'OtherRole'])
+
+    def test_cached_lists_are_not_shared_across_scopes(self):
+        self.client.force_authenticate(user=self.admin)
+        self.list_names('role-list')
+        self.client.force_authenticate(user=self.manager)
+        self.assertEqual(self.list_names('role-list'), ['Manager'])
+
+    def test_scope_is_filtered_in_sql(self):
+        self.client.force_authenticate(user=self.manager)
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('role-list'))
+        condition = '"orgapp_role"."organization_id" = %d' % self.default_organization.id
+        self.assertTrue(any(condition in query['sql'] for query in captured.captured_queries))
+
+    def test_user_without_organization_sees_nothing(self):
+        self.manager.organization = None
+        self.manager.save()
+        self.client.force_authenticate(user=self.manager)
+        self.assertEqual(self.list_names('role-list'), [])
+
+    def test_manager_writes_stay_in_scope(self):
+        self.client.force_authenticate(user=self.manager)
+        data = {'name': 'Intruder', 'description': 'Role', 'organization': self.other_organization.id}
+        response = self.client.post(reverse('role-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('organization', response.data)
+        url = reverse('role-detail', args=[self.manager_role.id])
+        response = self.client.patch(url, {'organization': self.other_organization.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Role.objects.filter(organization=self.other_organization).exclude(pk=self.other_role.pk).exists())
+
+        data['organization'] = self.default_organization.id
+        response = self.client.post(reverse('role-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.put(url, {'name': 'Manager', 'description': 'Edited', 'organization': self.default_organization.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('organization-list') + '?include_descendants=true', {'name': 'Child', 'description': 'Child', 'parent': self.default_organization.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(reverse('organization-list') + '?include_descendants=true', {'name': 'Root', 'description': 'Root'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_manager_writes_match_read_scope(self):
+        child = Organization.objects.create(name='Child', description='Child', parent=self.default_organization)
+        self.client.force_authenticate(user=self.manager)
+        data = {'name': 'ChildRole', 'description': 'Role', 'organization': child.id}
+        response = self.client.post(reverse('role-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        data = {'name': 'Grandchild', 'description': 'Grandchild', 'parent': child.id}
+        response = self.client.post(reverse('organization-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Role.objects.filter(organization=child).exists())
+        self.assertFalse(Organization.objects.filter(parent=child).exists())
+
+        for url_name, data in (
+            ('role-list', {'name': 'ChildRole', 'description': 'Role', 'organization': child.id}),
+            ('organization-list', {'name': 'Grandchild', 'description': 'Grandchild', 'parent': child.id}),
+        ):
+            response = self.client.post(reverse(url_name) + '?include_descendants=true', data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            detail = reverse(url_name.replace('-list', '-detail'), args=[response.data['id']])
+            self.assertEqual(self.client.get(detail + '?include_descendants=true').status_code, status.HTTP_200_OK)
+
+    def test_staff_writes_are_not_scoped(self):
+        self.client.force_authenticate(user=self.admin)
+        data = {'name': 'Elsewhere', 'description': 'Role', 'organization': self.other_organization.id}
+        response = self.client.post(reverse('role-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+class OrganizationHierarchyTests(APITestCase):
+    def setUp(self):
+        self.division = Organization.objects.create(name='Division', description='Division')
+        self.department = Organization.objects.create(name='Department', description='Department', parent=self.division)
+        self.team = Organization.objects.create(name='Team', description='Team', parent=self.department)
+        self.other = Organization.objects.create(name='Other', description='Other')
+        self.admin = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='password',
+            is_staff=True,
+            organization=self.division
+        )
+        for organization in (self.division, self.department, self.team, self.other):
+            User.objects.create(
+                username='user-%s' % organization.name.lower(),
+                email='%s@example.com' % organization.name.lower(),
+                organization=organization
+            )
+
+    def refresh(self, *organizations):
+        for organization in organizations:
+            organization.refresh_from_db()
+
+    def test_paths_follow_parents(self):
+        self.assertEqual(self.division.path, '/%d/' % self.division.id)
+        self.assertEqual(self.team.path, '/%d/%d/%d/' % (self.division.id, self.department.id, self.team.id))
+
+    def test_organization_with_children_cannot_be_deleted(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.delete(reverse('organization-detail', args=[self.department.id]))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Organization.objects.count(), 4)
+        self.assertFalse(AuditLog.objects.filter(resource='organization', action='delete').exists())
+        response = self.client.delete(reverse('organization-detail', args=[self.team.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(self.department.get_descendants()), [])
+
+    def test_subtree_lists_follow_moves(self):
+        role = Role.objects.create(name='OtherRole', description='Other role', organization=self.other)
+        self.client.force_authenticate(user=self.admin)
+        url = reverse('role-list') + '?organization=%d&include_descendants=true' % self.division.id
+        response = self.client.get(url)
+        self.assertEqual(response.data['results'], [])
+        self.client.patch(reverse('organization-detail', args=[self.other.id]), {'parent': self.department.id}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in response.data['results']], [role.id])
+
+    def test_descendants_and_ancestors_are_single_queries(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(list(self.division.get_descendants()), [self.department, self.team])
+        with self.assertNumQueries(1):
+            self.assertEqual(list(self.team.get_ancestors().order_by('id')), [self.division, self.department])
+
+    def test_users_in_subtree(self):
+        low, high = subtree_bounds(self.department.path)
+        with self.assertNumQueries(1):
+            usernames = set(User.objects.filter(organization__path__gte=low, organization__path__lt=high).values_list('username', flat=True))
+        self.assertEqual(usernames, {'user-department', 'user-team'})
+
+    def test_move_subtree_rewrites_descendant_paths(self):
+        self.department.parent = self.other
+        self.department.save()
+        self.refresh(self.team)
+        self.assertEqual(self.team.path, '/%d/%d/%d/' % (self.other.id, self.department.id, self.team.id))
+        self.assertEqual(list(self.division.get_descendants()), [])
+
+    def test_move_under_own_subtree_is_rejected(self):
+        self.client.force_authenticate(user=self.admin)
+        url = reverse('organization-detail', args=[self.division.id])
+        response = self.client.patch(url, {'parent': self.team.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.division.parent = self.team
+        with self.assertRaises(ValueError):
+            self.division.save()
+
+    def test_include_descendants_filter(self):
+        self.client.force_authenticate(user=self.admin)
+        url = reverse('user-list') + '?organization=%d' % self.department.id
+        response = self.client.get(url)
+        self.assertEqual([row['username'] for row in response.data['results']], ['user-department'])
+        response = self.client.get(url + '&include_descendants=true')
+        self.assertEqual([row['username'] for row in response.data['results']], ['user-department', 'user-team'])
+
+    def test_member_scope_includes_descendants(self):
+        member_role = Role.objects.create(name='Member', description='Member role', organization=self.division)
+        member = User.objects.get(username='user-division')
+        member.roles.add(member_role)
+        self.client.force_authenticate(user=member)
+        names = [row['name'] for row in self.client.get(reverse('organization-list')).data['results']]
+        self.assertEqual(names, ['Division'])
+        names = [row['name'] for row in self.client.get(reverse('organization-list') + '?include_descendants=true').data['results']]
+        self.assertEqual(names, ['Division', 'Department', 'Team'])
+
+    def test_descendants_and_ancestors_endpoints(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('organization-descendants', args=[self.division.id]))
+        self.assertEqual([row['name'] for row in response.data['results']], ['Department', 'Team'])
+        response = self.client.get(reverse('organization-ancestors', args=[self.team.id]))
+        self.assertEqual([row['name'] for row in response.data['results']], ['Division', 'Department'])
+
+
+class AuditLogTests(APITestCase):
+    def setUp(self):
+        self.default_organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.default_role = Role.objects.create(name='DefaultRole', description='Default Role', organization=self.default_organization)
+        self.other_role = Role.objects.create(name='OtherRole', description='Other Role', organization=self.default_organization)
+        self.superuser = User.objects.create_superuser(
+            username='superuser',
+            email='superuser@example.com',
+            password='password',
+            organization=self.default_organization
+        )
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password', organization=self.default_organization,
+        )
+        self.client.force_authenticate(user=self.superuser)
+
+    def entries(self, **filters):
+        return list(AuditLog.objects.filter(**filters).order_by('id'))
+
+    def test_viewset_writes_are_recorded_with_diffs(self):
+        data = {
+            'username': 'user2', 'email': 'user2@example.com', 'password': 'password',
+            'organization': self.default_organization.id, 'roles': [self.default_role.id],
+        }
+        user_id = self.client.post(reverse('user-list'), data, format='json').data['id']
+        url = reverse('user-detail', args=[user_id])
+        self.client.patch(url, {'email': 'changed@example.com', 'roles': [self.other_role.id]}, format='json')
+        self.client.delete(url)
+
+        created, updated, deleted = self.entries(resource='user', object_id=user_id)
+        self.assertEqual([created.action, updated.action, deleted.action], ['create', 'update', 'delete'])
+        self.assertEqual((created.actor_id, created.actor_username), (self.superuser.id, 'superuser'))
+        self.assertEqual(created.changes['username'], [None, 'user2'])
+        self.assertEqual(created.changes['password'], [None, '<redacted>'])
+        self.assertEqual(created.changes['roles'], {'added': [self.default_role.id], 'removed': []})
+        self.assertEqual(updated.changes, {
+            'email': ['user2@example.com', 'changed@example.com'],
+            'roles': {'added': [self.other_role.id], 'removed': [self.default_role.id]},
+        })
+        self.assertEqual(deleted.changes['email'], ['changed@example.com', None])
+        self.assertEqual(created.month, created.created_at.year * 100 + created.created_at.month)
+
+    def test_unchanged_update_is_not_recorded(self):
+        self.client.patch(reverse('role-detail', args=[self.default_role.id]), {'name': 'DefaultRole'}, format='json')
+        self.assertEqual(self.entries(), [])
+
+    def test_role_and_organization_writes_are_recorded(self):
+        self.client.patch(reverse('role-detail', args=[self.default_role.id]), {'name': 'Renamed'}, format='json')
+        self.client.patch(reverse('organization-detail', args=[self.default_organization.id]), {'description': 'New'}, format='json')
+        self.assertEqual(
+            [(entry.resource, entry.object_id, entry.changes) for entry in self.entries()],
+            [
+                ('role', self.default_role.id, {'name': ['DefaultRole', 'Renamed']}),
+                ('organization', self.default_organization.id, {'description': ['Default Description', 'New']}),
+            ],
+        )
+
+    def test_role_assignment_and_user_deletion_views(self):
+        self.client.post(reverse('user-assign-role', args=[self.user.id]), {'roles': [self.default_role.id]}, format='json')
+        self.client.post(
+            reverse('user-bulk-assign-roles'),
+            {'user_ids': [self.user.id], 'role_ids': [self.other_role.id], 'mode': 'replace'}, format='json',
+        )
+        self.client.delete(reverse('delete_user', args=[self.user.id]))
+        self.assertEqual(
+            [(entry.action, entry.changes.get('roles')) for entry in self.entries(object_id=self.user.id)],
+            [
+                ('update', {'added': [self.default_role.id], 'removed': []}),
+                ('update', {'added': [self.other_role.id], 'removed': [self.default_role.id]}),
+                ('delete', {'added': [], 'removed': [self.other_role.id]}),
+            ],
+        )
+        self.assertTrue(all(entry.actor_id == self.superuser.id for entry in self.entries()))
+
+    def test_bulk_create_and_import_are_recorded(self):
+        data = [
+            {'username': 'bulk%d' % index, 'email': 'bulk%d@example.com' % index, 'password': 'secret',
+             'organization': self.default_organization.id, 'roles': [self.default_role.id]}
+            for index in range(2)
+        ]
+        self.client.post(reverse('user-bulk-create'), data, format='json')
+        upload = SimpleUploadedFile('users.csv', b'username,email,organization,roles\nimported,imported@example.com,DefaultOrg,DefaultRole\n')
+        self.client.post(reverse('user-import'), {'file': upload}, format='multipart')
+        entries = self.entries(action='create')
+        self.assertEqual([entry.changes['username'][1] for entry in entries], ['bulk0', 'bulk1', 'imported'])
+        self.assertEqual(
+            [entry.object_id for entry in entries],
+            list(User.objects.filter(username__in=['bulk0', 'bulk1', 'imported']).order_by('id').values_list('id', flat=True)),
+        )
+        for entry in entries:
+            self.assertEqual(entry.actor_id, self.superuser.id)
+            self.assertEqual(entry.changes['roles'], {'added': [self.default_role.id], 'removed': []})
+
+    def test_entries_are_append_only(self):
+        audit.record([audit.build_entry(self.superuser, audit.UPDATE, 'user', self.user.id, {'email': ['a', 'b']})])
+        entry = AuditLog.objects.get()
+        with self.assertRaises(ValueError):
+            entry.save()
+        with self.assertRaises(ValueError):
+            entry.delete()
+        with self.assertRaises(ValueError):
+            AuditLog.objects.update(action='delete')
+        with self.assertRaises(ValueError):
+            AuditLog.objects.all().delete()
+
+    def test_read_api_pages_newest_first_and_filters(self):
+        for index in range(3):
+            self.client.patch(reverse('user-detail', args=[self.user.id]), {'first_name': 'Name%d' % index}, format='json')
+        self.client.patch(reverse('role-detail', args=[self.default_role.id]), {'name': 'Renamed'}, format='json')
+        url = reverse('auditlog-list')
+
+        response = self.client.get(url + '?page_size=2')
+        self.assertEqual([row['resource'] for row in response.data['results']], ['role', 'user'])
+        self.assertEqual(response.data['results'][1]['changes'], {'first_name': ['Name1', 'Name2']})
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['changes']['first_name'][1] for row in response.data['results']], ['Name1', 'Name0'])
+
+        response = self.client.get(url + '?resource=user&object_id=%d&actor=%d' % (self.user.id, self.superuser.id))
+        self.assertEqual(len(response.data['results']), 3)
+        response = self.client.get(url + '?object_id=abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.post(url, {}, format='json').status_code, status.HTTP_403_FORBIDDEN)
+
+
+class AuditWorkerTests(APITransactionTestCase):
+    def setUp(self):
+        audit.shutdown()
+        self.addCleanup(audit.shutdown)
+        self.organization = Organization.objects.create(name='DefaultOrg', description='Default Description')
+        self.admin = User.objects.create_superuser(
+            username='superuser', email='superuser@example.com', password='password', organization=self.organization,
+        )
+
+    def test_entries_are_written_in_batches_after_commit(self):
+        self.client.force_authenticate(user=self.admin)
+        with self.settings(ORGAPP_AUDIT_ASYNC=True, ORGAPP_AUDIT_BATCH_SIZE=2, ORGAPP_AUDIT_FLUSH_INTERVAL=0.5):
+            with mock.patch('orgapp.audit.write', wraps=audit.write) as write:
+                for index in range(5):
+                    self.client.post(reverse('role-list'), {
+                        'name': 'Role%d' % index, 'description': 'Role', 'organization': self.organization.id,
+                    }, format='json')
+                audit.flush()
+        self.assertEqual(AuditLog.objects.filter(resource='role', action='create').count(), 5)
+        self.assertEqual(sum(len(call.args[0]) for call in write.call_args_list), 5)
+        self.assertTrue(all(len(call.args[0]) <= 2 for call in write.call_args_list))
+        self.assertEqual(audit.get_writer().written, 5)
+
+    def test_rolled_back_writes_are_not_recorded(self):
+        with self.settings(ORGAPP_AUDIT_ASYNC=True):
+            with self.assertRaises(OperationalError):
+                with transaction.atomic():
+                    audit.record([audit.build_entry(self.admin, audit.CREATE, 'role', 1, {})])
+                    raise OperationalError('rolled back')
+            audit.flush()
+        self.assertFalse(AuditLog.objects.exists())
+
+    def test_full_queue_falls_back_to_synchronous_write(self):
+        writer = audit.AuditWriter(maxsize=1)
+        entries = [audit.build_entry(self.admin, audit.CREATE, 'role', index, {}) for index in range(3)]
+        with self.settings(ORGAPP_AUDIT_BLOCK_TIMEOUT=0), mock.patch.object(writer, 'start'):
+            writer.put(entries)
+        # The first entry waits in the queue, the other two were written by
+        # the caller.
+        self.assertEqual(writer.fallbacks, 1)
+        self.assertEqual(sorted(AuditLog.objects.values_list('object_id', flat=True)), [1, 2])
+        writer.start()
+        writer.flush()
+        writer.stop()
+        self.assertEqual(sorted(AuditLog.objects.values_list('object_id', flat=True)), [0, 1, 2])
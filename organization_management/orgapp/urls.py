@@ -1,16 +1,30 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import OrganizationViewSet, RoleViewSet, UserViewSet
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from .views import AuditLogViewSet, OrganizationViewSet, RoleViewSet, UserViewSet
 from . import views
+from .async_views import async_view
 
 router = DefaultRouter()
 router.register(r'organizations', OrganizationViewSet)
 router.register(r'roles', RoleViewSet)
 router.register(r'users', UserViewSet)
+router.register(r'audit-log', AuditLogViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('token/', TokenObtainPairView.as_view(), name='token-obtain'),
+    path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('async/organizations/', async_view(OrganizationViewSet, {'get': 'list'}, 'organization'), name='async-organization-list'),
+    path('async/organizations/<int:pk>/', async_view(OrganizationViewSet, {'get': 'retrieve'}, 'organization'), name='async-organization-detail'),
+    path('async/roles/', async_view(RoleViewSet, {'get': 'list'}, 'role'), name='async-role-list'),
+    path('async/roles/<int:pk>/', async_view(RoleViewSet, {'get': 'retrieve'}, 'role'), name='async-role-detail'),
+    path('async/users/', async_view(UserViewSet, {'get': 'list'}, 'user'), name='async-user-list'),
+    path('async/users/<int:pk>/', async_view(UserViewSet, {'get': 'retrieve'}, 'user'), name='async-user-detail'),
     path('user/<int:user_id>/', views.delete_user, name='delete_user'),
     path('user/assign-role/<int:user_id>/', views.assign_role_to_user, name='user-assign-role'),
+    path('user/assign-roles/', views.bulk_assign_roles, name='user-bulk-assign-roles'),
+    path('user/import/', views.import_users, name='user-import'),
+    path('export/<str:resource>/', views.export_data, name='export'),
 ]
 
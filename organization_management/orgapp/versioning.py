@@ -0,0 +1,53 @@
+"""
+Per-table change tokens kept in the cache and replaced by signal handlers
+whenever a row of the table is saved or deleted.
+
+Conditional GET and response caching derive their keys from these tokens,
+so deciding whether a resource changed never touches the table itself.
+Deployments running several processes need a shared cache backend for the
+tokens to be seen by every process.
+
+Signals fire before the write commits, and a reader in between can store
+the old rows under the new token. ``bump`` inside a transaction therefore
+replaces the tokens again once it commits.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+KEY_PREFIX = 'orgapp:version:'
+
+
+def get_cache():
+    return caches[getattr(settings, 'ORGAPP_VERSION_CACHE', 'default')]
+
+
+def _new_version():
+    return uuid.uuid4().hex, time.time()
+
+
+def get_version(table):
+    """
+    Returns ``(token, last_modified)`` for ``table``, where ``last_modified``
+    is a Unix timestamp.
+    """
+    cache = get_cache()
+    key = KEY_PREFIX + table
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def _replace(tables):
+    get_cache().set_many({KEY_PREFIX + table: _new_version() for table in tables}, None)
+
+
+def bump(*tables, using='default'):
+    _replace(tables)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(lambda: _replace(tables), using=using)
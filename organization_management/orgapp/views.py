@@ -1,11 +1,28 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets
-from .models import Organization, Role, User
-from .serializers import OrganizationSerializer, RoleSerializer, UserSerializer
-from rest_framework.permissions import IsAuthenticated, IsAdminUser, BasePermission
+from .models import AuditLog, Organization, Role, User
+from .serializers import AuditLogSerializer, OrganizationSerializer, RoleSerializer, UserSerializer, BulkRoleAssignmentSerializer
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import action, api_view, parser_classes, permission_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from .permissions import IsManager, IsMember
+from .permissions import CanAssignRoles, IsAdmin, IsManager, IsMember
+from . import audit, bulk
+from .conditional import ConditionalGetMixin
+from .fast import FastListMixin
+from .fieldsets import SparseFieldsetMixin
+from .pagination import AuditLogPagination
+from .filters import BooleanFilter, ExactFilter, PrefixFilter, QueryParamFilterBackend, RelatedExactFilter, UserSearch
+from .response_cache import CachedListMixin
+from .routers import ReplicaReadMixin
+from .scoping import OrganizationScopedMixin
+from .sqlite import SerializedWriteMixin, run_write
+from . import exporters
+from .importers import FORMATS, UserImporter, format_from_name, iter_rows
 
 def update_user(request, user_id):
     try:
@@ -22,26 +39,79 @@ def update_user(request, user_id):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['POST'])
+@permission_classes([CanAssignRoles])
 def assign_role_to_user(request, user_id):
     try:
         user = User.objects.get(id=user_id)
     except User.DoesNotExist:
         return Response({"message": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    # Ensure that the current user has permission to assign roles
-    if not request.user.has_perm('orgapp.assign_roles'):
-        return Response({"message": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
-
-
     # Assuming you have a way to extract role information from the request data
     role_ids = request.data.get('roles', [])
     roles = Role.objects.filter(id__in=role_ids)
 
-    user.roles.set(roles)
-    user.save()
+    def assign():
+        before = audit.snapshot(user)
+        user.roles.set(roles)
+        audit.log_change(request.user, audit.UPDATE, user, before, audit.snapshot(user))
+
+    run_write(assign)
 
     return Response({"message": "Roles assigned successfully"}, status=status.HTTP_200_OK)
 
+@api_view(['POST'])
+@permission_classes([CanAssignRoles])
+def bulk_assign_roles(request):
+    serializer = BulkRoleAssignmentSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    results = run_write(bulk.assign_roles, actor=request.user, **serializer.validated_data)
+    return Response({"results": results}, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser])
+@permission_classes([IsAdmin])
+def import_users(request):
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({"message": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST)
+
+    file_format = request.query_params.get('file_format') or format_from_name(upload.name)
+    if file_format not in FORMATS:
+        return Response({"message": "Unsupported file format"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        batch_size = int(request.query_params.get('batch_size', 1000))
+    except ValueError:
+        batch_size = 0
+    if batch_size < 1:
+        return Response({"message": "batch_size must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+    importer = UserImporter(
+        batch_size=batch_size,
+        dry_run=request.query_params.get('dry_run') in ('1', 'true'),
+        actor=request.user,
+    )
+    lines = (line.decode('utf-8-sig') for line in upload)
+    result = importer.run(iter_rows(lines, file_format))
+    return Response(result, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def export_data(request, resource):
+    if resource not in exporters.RESOURCES:
+        return Response({"message": "Unknown resource"}, status=status.HTTP_404_NOT_FOUND)
+    file_format = request.query_params.get('file_format', exporters.NDJSON)
+    if file_format not in exporters.FORMATS:
+        return Response({"message": "Unsupported file format"}, status=status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(
+        exporters.iter_export(resource, file_format),
+        content_type=exporters.CONTENT_TYPES[file_format],
+    )
+    response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (resource, file_format)
+    return response
+
 @api_view(['DELETE'])
 def delete_user(request, user_id):
     try:
@@ -49,33 +119,131 @@ def delete_user(request, user_id):
     except User.DoesNotExist:
         return Response({"message": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    user.delete()
-
-    return Response({"message": "User deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
-
-class IsAdmin(BasePermission):
-    def has_permission(self, request, view):
-        return request.user.is_staff
+    def delete():
+        before = audit.snapshot(user)
+        user.delete()
+        audit.log_change(request.user, audit.DELETE, user, before, object_id=user_id)
 
-class IsManager(BasePermission):
-    def has_permission(self, request, view):
-        return request.user.roles.filter(name='Manager').exists()
+    run_write(delete)
 
-class IsMember(BasePermission):
-    def has_permission(self, request, view):
-        return request.user.roles.filter(name='Member').exists()
+    return Response({"message": "User deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
 
-class OrganizationViewSet(viewsets.ModelViewSet):
+def count_subquery(queryset, field):
+    """
+    Correlated ``COUNT(*)`` of ``queryset`` rows whose ``field`` matches the
+    outer row. Unlike ``Count()`` over joins, several of these can be
+    combined without multiplying rows.
+    """
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('*')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+class OrganizationViewSet(SparseFieldsetMixin, OrganizationScopedMixin, ConditionalGetMixin, CachedListMixin,
+                          FastListMixin, ReplicaReadMixin, SerializedWriteMixin, audit.AuditedWriteMixin,
+                          viewsets.ModelViewSet):
+    # user_count and role_count change with the user and role tables.
+    version_tables = ('organization', 'role', 'user')
+    replica_actions = ('list', 'retrieve', 'summary', 'descendants', 'ancestors')
+    fieldset_actions = ('list', 'retrieve', 'descendants', 'ancestors')
+    scope_field = 'id'
+    path_field = 'path'
+    write_scope_field = 'parent'
+    write_scope_nested = True
     queryset = Organization.objects.all()
+    field_annotations = {
+        'user_count': count_subquery(User.objects.all(), 'organization'),
+        'role_count': count_subquery(Role.objects.all(), 'organization'),
+    }
     serializer_class = OrganizationSerializer
     permission_classes = [IsAdmin| IsManager| IsMember]
 
-class RoleViewSet(viewsets.ModelViewSet):
-    queryset = Role.objects.all()
+    def destroy(self, request, *args, **kwargs):
+        # Organization.parent is PROTECT; answer before the delete fails.
+        organization = self.get_object()
+        if organization.children.exists():
+            return Response({"message": "Organization has child organizations"}, status=status.HTTP_409_CONFLICT)
+        self.perform_destroy(organization)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True)
+    def summary(self, request, pk=None):
+        organization = self.get_object()
+        key = 'orgapp:organization-summary:%s' % organization.pk
+        summary = cache.get(key)
+        if summary is None:
+            roles = list(
+                Role.objects.filter(organization=organization)
+                .annotate(member_count=count_subquery(User.roles.through.objects.all(), 'role'))
+                .order_by('id')
+                .values('id', 'name', 'member_count')
+            )
+            summary = {
+                'id': organization.pk,
+                'name': organization.name,
+                'user_count': organization.user_count,
+                'role_count': organization.role_count,
+                'roles': roles,
+            }
+            cache.set(key, summary, getattr(settings, 'ORGAPP_SUMMARY_CACHE_TIMEOUT', 60))
+        return Response(summary)
+
+    @action(detail=True)
+    def descendants(self, request, pk=None):
+        organization = self.get_object()
+        return self.list_response(self.get_queryset().filter(pk__in=organization.get_descendants().values('pk')))
+
+    @action(detail=True)
+    def ancestors(self, request, pk=None):
+        organization = self.get_object()
+        return self.list_response(self.get_queryset().filter(pk__in=organization.get_ancestors().values('pk')))
+
+class RoleViewSet(SparseFieldsetMixin, OrganizationScopedMixin, ConditionalGetMixin, CachedListMixin,
+                  FastListMixin, ReplicaReadMixin, SerializedWriteMixin, audit.AuditedWriteMixin,
+                  viewsets.ModelViewSet):
+    version_tables = ('role',)
+    queryset = Role.objects.prefetch_related('permissions')
     serializer_class = RoleSerializer
     permission_classes = [IsAdmin | IsManager]
-
-class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+    filter_backends = [QueryParamFilterBackend]
+    query_filters = {
+        'name': PrefixFilter('name'),
+    }
+
+class UserViewSet(SparseFieldsetMixin, OrganizationScopedMixin, FastListMixin, ReplicaReadMixin,
+                  SerializedWriteMixin, audit.AuditedWriteMixin, viewsets.ModelViewSet):
+    queryset = User.objects.prefetch_related('roles')
     serializer_class = UserSerializer
     permission_classes = [IsAdmin]
+    filter_backends = [QueryParamFilterBackend]
+    query_filters = {
+        'role': ExactFilter('roles', int),
+        'role_name': RelatedExactFilter(User.roles.through.objects.all(), 'user_id', 'role__name'),
+        'is_active': BooleanFilter('is_active'),
+        'is_staff': BooleanFilter('is_staff'),
+        'username': PrefixFilter('username'),
+        'email': PrefixFilter('email'),
+        'search': UserSearch(),
+    }
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request):
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        users = serializer.save()
+        created = User.objects.filter(id__in=[user.pk for user in users]).prefetch_related('roles').order_by('id')
+        return Response(self.get_serializer(created, many=True).data, status=status.HTTP_201_CREATED)
+
+class AuditLogViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
+    # Entries reach the table from the background writer shortly after the
+    # write commits.
+    queryset = AuditLog.objects.all()
+    serializer_class = AuditLogSerializer
+    permission_classes = [IsAdmin]
+    pagination_class = AuditLogPagination
+    filter_backends = [QueryParamFilterBackend]
+    query_filters = {
+        'resource': ExactFilter('resource'),
+        'object_id': ExactFilter('object_id', int),
+        'actor': ExactFilter('actor_id', int),
+        'action': ExactFilter('action'),
+        'month': ExactFilter('month', int),
+    }